@@ -0,0 +1,199 @@
+from collections import OrderedDict
+import numpy as np
+import scipy.sparse as spa
+from mlopt import settings as stg
+from mlopt import error as e
+
+
+def cache_entry_nbytes(entry):
+    """Memory used by a solver cache entry in bytes."""
+    factors = entry['factors'] if 'factors' in entry else entry['symbolic']
+    nbytes = factors.nbytes
+    for M in entry.get('policy', {}).values():
+        if spa.issparse(M):
+            nbytes += M.data.nbytes + M.indices.nbytes + M.indptr.nbytes
+        else:
+            nbytes += M.nbytes
+    return nbytes
+
+
+class FactorCache(object):
+    """
+    Lazy cache of the KKT factors of each strategy.
+
+    The factors of a strategy are computed on first use. If the resident
+    memory exceeds the byte budget, the least recently used (LRU) or
+    least frequently used (LFU) factors are evicted.
+
+    Parameters
+    ----------
+    n_strategies : int
+        Number of strategies.
+    build_fn : function
+        Function :code:`build_fn(label, policy)` computing the cache entry
+        of a strategy as a dict with the 'factors' (or the 'symbolic'
+        analysis to refactorize) and the 'policy'.
+    policy : bool or str, optional
+        Compute the affine policies. See :meth:`Optimizer.cache_factors`.
+    max_bytes : int, optional
+        Byte budget. Unlimited if None. Defaults to
+        :data:`settings.FACTOR_CACHE_MAX_BYTES`.
+    eviction : str, optional
+        Eviction rule, 'lru' or 'lfu'. Defaults to
+        :data:`settings.FACTOR_CACHE_EVICTION`.
+
+    Attributes
+    ----------
+    bases : numpy array
+        Base strategy of each strategy whose factors are derived from
+        the base factors (-1 for none). None if not used. Derived
+        factors keep their base factors in memory, which count in the
+        byte budget while the base strategy is not resident.
+    """
+
+    def __init__(self, n_strategies, build_fn, policy=False,
+                 max_bytes=None, eviction=None):
+        if max_bytes is None:
+            max_bytes = stg.FACTOR_CACHE_MAX_BYTES
+        if eviction is None:
+            eviction = stg.FACTOR_CACHE_EVICTION
+        if eviction not in ['lru', 'lfu']:
+            e.value_error("Eviction rule %s not supported. "
+                          "Use 'lru' or 'lfu'." % eviction)
+        self.n_strategies = n_strategies
+        self.policy = policy
+        self.max_bytes = max_bytes
+        self.eviction = eviction
+        self.bases = None
+        self._build_fn = build_fn
+        self._entries = OrderedDict()  # Label -> entry, LRU first
+        self._nbytes = {}
+        self._counts = np.zeros(n_strategies, dtype=int)
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def __len__(self):
+        return self.n_strategies
+
+    def __bool__(self):
+        return self.n_strategies > 0
+
+    def __contains__(self, label):
+        """Check if the factors of the strategy are resident."""
+        return label in self._entries
+
+    def __getitem__(self, label):
+        label = int(label)
+        self._counts[label] += 1
+        if label in self._entries:
+            self.hits += 1
+            self._entries.move_to_end(label)
+            return self._entries[label]
+
+        self.misses += 1
+        return self._insert(label)
+
+    def peek(self, label):
+        """Resident cache entry of a strategy (None if not resident).
+        It does not count as cache access."""
+        return self._entries.get(int(label))
+
+    def _build(self, label):
+        if self._build_fn is None:
+            e.value_error("Factor cache has no function to compute "
+                          "the factors of strategy %d." % label)
+        return self._build_fn(label, self.policy)
+
+    def _insert(self, label):
+        return self.add(label, self._build(label))
+
+    def fits(self, entry):
+        """Check if the entry fits in the byte budget without evicting."""
+        if self.max_bytes is None:
+            return True
+        entries = list(self._entries.values()) + [entry]
+        return sum(self._nbytes.values()) + cache_entry_nbytes(entry) + \
+            self._held_bases_nbytes(entries) <= self.max_bytes
+
+    @staticmethod
+    def _held_bases_nbytes(entries):
+        """Memory used by the base factors kept by derived factors
+        in entries but not resident themselves."""
+        resident = set(id(entry.get('factors')) for entry in entries)
+        held = {}
+        for entry in entries:
+            base = getattr(entry.get('factors'), 'base', None)
+            if base is not None and id(base) not in resident:
+                held[id(base)] = base.nbytes
+        return sum(held.values())
+
+    def add(self, label, entry):
+        """Store the cache entry of a strategy computed elsewhere."""
+        label = int(label)
+        self._entries[label] = entry
+        self._nbytes[label] = cache_entry_nbytes(entry)
+        self._evict(keep=label)
+        return entry
+
+    def _evict(self, keep):
+        """Evict entries until the cache fits in the budget."""
+        if self.max_bytes is None:
+            return
+        while self.resident_bytes > self.max_bytes and \
+                len(self._entries) > 1:
+            candidates = [k for k in self._entries if k != keep]
+            if self.eviction == 'lru':
+                label = candidates[0]
+            else:
+                label = min(candidates, key=lambda k: self._counts[k])
+            del self._entries[label]
+            del self._nbytes[label]
+            self.evictions += 1
+
+    def prewarm(self, labels):
+        """Compute the factors of the strategies in labels in order until
+        the next ones do not fit in the byte budget. Resident factors
+        are not evicted. It does not count as cache accesses.
+
+        Returns
+        -------
+        bool
+            True if all the strategies in labels are resident.
+        """
+        for label in labels:
+            label = int(label)
+            if label not in self._entries:
+                entry = self._build(label)
+                if not self.fits(entry):
+                    return False
+                self.add(label, entry)
+        return True
+
+    def bind(self, build_fn):
+        """Set the function computing the factors, e.g., after loading."""
+        self._build_fn = build_fn
+
+    @property
+    def hit_rate(self):
+        """Fraction of accesses finding resident factors."""
+        n_access = self.hits + self.misses
+        return self.hits / n_access if n_access else 0.
+
+    @property
+    def resident_bytes(self):
+        """Memory used by the resident factors in bytes, including the
+        base factors kept by derived factors."""
+        return sum(self._nbytes.values()) + \
+            self._held_bases_nbytes(self._entries.values())
+
+    @property
+    def resident(self):
+        """Labels of the resident strategies."""
+        return list(self._entries.keys())
+
+    def __getstate__(self):
+        """Do not pickle the function computing the factors."""
+        state = self.__dict__.copy()
+        state['_build_fn'] = None
+        return state
@@ -1,4 +1,3 @@
-from joblib import Parallel, delayed
 from mlopt import settings as stg
 import numpy as np
 from mlopt import utils as u
@@ -11,7 +10,8 @@ def best_strategy(theta, obj_train, encoding, problem):
     problem.populate(theta)  # Populate parameters
 
     # Serial solution over the strategies
-    results = [problem.solve(strategy=strategy) for strategy in encoding]
+    results = [problem.solve(strategy=strategy, need_strategy=False)
+               for strategy in encoding]
 
     # Compute cost degradation
     degradation = []
@@ -77,11 +77,15 @@ class Filter(object):
         stg.logger.info("Assign samples to selected strategies (n_jobs = %d)"
                         % n_jobs)
 
-        results = Parallel(n_jobs=n_jobs, batch_size=batch_size)(
-            delayed(best_strategy)(self.X_train.iloc[i], self.obj_train[i],
-                                   self.encoding, self.problem)
-            for i in tqdm(range(len(discarded_samples)))
-        )
+        args = [(self.X_train.iloc[i], self.obj_train[i], self.encoding)
+                for i in discarded_samples]
+        if n_jobs == 1:
+            results = [best_strategy(*a, self.problem) for a in tqdm(args)]
+        else:
+            results = self.problem.worker_pool(n_jobs).map(
+                best_strategy, args,
+                solver_options=self.problem.solver_options,
+                chunk_size=batch_size)
 
         for i in range(len(discarded_samples)):
             sample_idx = discarded_samples[i]
@@ -136,7 +140,7 @@ class Filter(object):
                 self.select_strategies(samples_fraction=samples_fraction)
 
             # Reassign encodings and labels
-            self.encoding = [self.encoding[i] for i in selected_strategies]
+            self.encoding = self.encoding[selected_strategies]
 
             # Find discarded samples
             discarded_samples = np.array([i for i in range(n_samples)
@@ -1,4 +1,5 @@
 # Define and solve equality constrained QP
+from abc import ABC, abstractmethod
 from cvxpy.reductions.solvers.qp_solvers.qp_solver import QpSolver
 import cvxpy.settings as cps
 import cvxpy.interface as intf
@@ -10,12 +11,12 @@ import numpy as np
 
 #  from pypardiso import spsolve
 #  from pypardiso.pardiso_wrapper import PyPardisoError
-from scipy.sparse.linalg import spsolve
-from scipy.sparse.linalg import factorized
-from scikits.umfpack import UmfpackWarning
+import scipy.linalg as la
+from scipy.sparse.linalg import splu
 import time
 import warnings
 from mlopt import settings as stg
+from mlopt import error as e
 
 KKT = "KKT"
 
@@ -27,7 +28,10 @@ class CatchSingularMatrixWarnings(object):
 
     def __enter__(self):
         self.catcher.__enter__()
-        warnings.simplefilter("ignore", UmfpackWarning)
+        if UmfpackFactors.is_installed():
+            from scikits.umfpack import UmfpackWarning
+            warnings.simplefilter("ignore", UmfpackWarning)
+        warnings.simplefilter("ignore", la.LinAlgWarning)
 
         warnings.filterwarnings(
             "ignore",
@@ -39,20 +43,39 @@ class CatchSingularMatrixWarnings(object):
 
 
 def create_kkt_matrix(data):
-    """Create KKT matrix from data."""
+    """Create KKT matrix from data.
+
+    If the integer variables are eliminated, the reduced
+    cost matrix is over the continuous variables only."""
     A_con = data[cps.A + "_red"]
+    P = data.get(cps.P + "_red", data[cps.P])
     n_con = A_con.shape[0]
     O_con = spa.csc_matrix((n_con, n_con))
 
     # Create KKT linear system
-    KKT = spa.vstack([spa.hstack([data[cps.P], A_con.T]),
+    KKT = spa.vstack([spa.hstack([P, A_con.T]),
                       spa.hstack([A_con, O_con])], format='csc')
     return KKT
 
 
 def create_kkt_rhs(data):
     """Create KKT rhs from data."""
-    return np.concatenate((-data[cps.Q], data[cps.B + "_red"]))
+    return np.concatenate((-data.get(cps.Q + "_red", data[cps.Q]),
+                           data[cps.B + "_red"]))
+
+
+def expand_kkt_solution(data, sol):
+    """Split KKT solution in x and y. If the integer variables
+    are eliminated, scatter x back with their fixed values."""
+    if "cont_idx" not in data:
+        n_var = data[cps.P].shape[0]
+        return sol[:n_var], sol[n_var:]
+
+    cont = data["cont_idx"]
+    x = np.empty(data[cps.P].shape[0])
+    x[cont] = sol[:len(cont)]
+    x[data[cps.INT_IDX]] = data["int_vars"]
+    return x, sol[len(cont):]
 
 
 def create_kkt_system(data):
@@ -64,10 +87,647 @@ def create_kkt_system(data):
     return KKT, rhs
 
 
-def factorize_kkt_matrix(KKT):
+class KKTFactors(ABC):
+    """
+    Factorization of a KKT matrix.
+
+    Factors are callable and solve the KKT system for a vector or a
+    matrix of right-hand sides. Singular matrices give NaN solutions.
+
+    If the KKT matrix is singular, e.g., because of redundant
+    constraint rows, and the number of variables is known, the
+    quasi-definite matrix with :data:`KKT_REG` added to the diagonal
+    of the cost block and subtracted from the diagonal of the
+    constraints block is factorized instead
+    (see :data:`settings.KKT_REGULARIZE`). The solutions are corrected
+    with :data:`KKT_REFINE_ITER` steps of iterative refinement with the
+    original matrix. Solutions with relative residual above
+    :data:`KKT_RESIDUAL_TOL` (inconsistent systems) are NaN.
+    """
+
+    name = None
+    quasi_definite = False  # Factorize only quasi-definite matrices
+    regularizable = True  # Regularize singular matrices
+
+    def __init__(self, KKT, n_var=None):
+        self.n = KKT.shape[0]
+        self.n_var = n_var
+        self.singular = False
+        self.regularized = False
+        with CatchSingularMatrixWarnings():
+            if not self.quasi_definite:
+                try:
+                    self.factorize(KKT)
+                    return
+                except (RuntimeError, la.LinAlgError):
+                    if not (self.regularizable and stg.KKT_REGULARIZE and
+                            n_var is not None):
+                        self.singular = True
+                        return
+            self._factorize_regularized(KKT)
+
+    def _regularize(self, KKT):
+        reg = np.concatenate([stg.KKT_REG * np.ones(self.n_var),
+                              -stg.KKT_REG * np.ones(self.n - self.n_var)])
+        return KKT + spa.diags(reg)
+
+    def _factorize_regularized(self, KKT):
+        if self.n_var is None:
+            e.value_error("The number of variables is needed "
+                          "to regularize the KKT matrix.")
+        self._KKT = spa.csc_matrix(KKT)
+        self._KKT.sum_duplicates()
+        self.regularized = True
+        try:
+            self.factorize(self._regularize(self._KKT))
+        except (RuntimeError, la.LinAlgError):
+            self.singular = True
+
+    def _refine(self, rhs):
+        """Solve with the regularized factors and iterative refinement."""
+        x = self.solve(rhs)
+        for _ in range(stg.KKT_REFINE_ITER):
+            x += self.solve(rhs - self._KKT @ x)
+
+        # Inconsistent systems
+        residual = np.max(np.abs(self._KKT @ x - rhs), axis=0)
+        tol = stg.KKT_RESIDUAL_TOL * (1 + np.max(np.abs(rhs), axis=0))
+        x[..., residual > tol] = np.nan
+        return x
+
+    @classmethod
+    def is_installed(cls):
+        return True
+
+    @abstractmethod
+    def factorize(self, KKT):
+        """Factorize KKT matrix."""
+        return NotImplemented
+
+    @abstractmethod
+    def solve(self, rhs):
+        """Solve with the factors."""
+        return NotImplemented
+
+    def refactorize(self, KKT):
+        """Factorize a KKT matrix with the same sparsity pattern reusing
+        the symbolic analysis of these factors. Backends without a
+        reusable analysis factorize the matrix from scratch."""
+        return type(self)(KKT, n_var=self.n_var)
+
+    @property
+    @abstractmethod
+    def nbytes(self):
+        """Memory used by the factors in bytes."""
+        return NotImplemented
+
+    def __call__(self, rhs):
+        if self.singular:
+            return np.full(rhs.shape, np.nan)
+        with CatchSingularMatrixWarnings():
+            if self.regularized:
+                return self._refine(rhs)
+            return self.solve(rhs)
+
+
+def _check_pivots(d):
+    """Raise an error if the relative pivots d are below
+    :data:`KKT_SINGULAR_TOL`."""
+    d = np.abs(d)
+    if len(d) and not np.min(d) > stg.KKT_SINGULAR_TOL * np.max(d):
+        raise la.LinAlgError("KKT matrix is numerically singular")
+
+
+def independent_rows(A):
+    """Indices of a maximal set of linearly independent rows of A
+    from the pivoted QR decomposition of A'."""
+    A = A.toarray() if spa.issparse(A) else np.asarray(A)
+    if A.shape[0] == 0:
+        return np.arange(0)
+    _, R, piv = la.qr(A.T, mode='economic', pivoting=True)
+    d = np.abs(np.diag(R))
+    tol = max(A.shape) * np.finfo(float).eps * d[0] if len(d) else 0.
+    return np.sort(piv[:np.sum(d > tol)])
+
+
+def _triangular_solver(T):
+    """Solver of a sparse triangular system. The LU factorization
+    of a triangular matrix with natural ordering and diagonal pivoting
+    has no fill-in and takes linear time."""
+    return splu(spa.csc_matrix(T), permc_spec='NATURAL',
+                diag_pivot_thresh=0., options={'SymmetricMode': True})
+
+
+class SparseLUFactors(KKTFactors):
+    """
+    Sparse LU factorization :code:`Pr (R^-1 KKT) Pc = L U` with row
+    permutation :code:`Pr`, column permutation :code:`Pc` and
+    row scaling :code:`R`.
+
+    The factorization objects of the sparse solvers cannot be pickled.
+    When pickled, the factors are stored explicitly as triangular
+    matrices and permutations and they are solved directly after
+    loading, without refactorizing the KKT matrix.
+    """
+
+    _lu = None
+    _tri = None
+
+    @abstractmethod
+    def explicit_factors(self):
+        """Explicit factors L, U, perm_r, perm_c, and the row
+        scaling (None if not scaled)."""
+        return NotImplemented
+
+    def solve(self, rhs):
+        if self._lu is not None:
+            return self._lu.solve(rhs)
+
+        # Solve with explicit factors
+        L_solver, U_solver, perm_r, perm_c, scale = self._tri_solvers
+        if scale is not None:
+            rhs = rhs / (scale if rhs.ndim == 1 else scale[:, None])
+        z = np.empty(rhs.shape)
+        z[perm_r] = rhs
+        w = U_solver.solve(L_solver.solve(z))
+        return w[perm_c]
+
+    def _check_factors(self):
+        _check_pivots(self._lu.U.diagonal())
+
+    @property
+    def nbytes(self):
+        if self.singular:
+            return 0
+        L, U, perm_r, perm_c, scale = self.explicit_factors()
+        nbytes = L.data.nbytes + L.indices.nbytes + L.indptr.nbytes + \
+            U.data.nbytes + U.indices.nbytes + U.indptr.nbytes + \
+            perm_r.nbytes + perm_c.nbytes
+        if scale is not None:
+            nbytes += scale.nbytes
+        return nbytes
+
+    def __getstate__(self):
+        """Store explicit factors instead of the solver object."""
+        state = self.__dict__.copy()
+        if not self.singular:
+            state['_tri'] = self.explicit_factors()
+        state['_lu'] = None
+        state.pop('_tri_solvers', None)
+        return state
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        if self._tri is not None:
+            L, U, perm_r, perm_c, scale = self._tri
+            self._tri_solvers = (_triangular_solver(L),
+                                 _triangular_solver(U),
+                                 perm_r, perm_c, scale)
+
+
+class SuperLUFactors(SparseLUFactors):
+    """Sparse LU factorization with SuperLU from scipy.
+
+    The fill-reducing column ordering can be given to skip
+    the ordering step, e.g., when refactorizing matrices
+    with the same sparsity pattern.
+    """
+
+    name = stg.SUPERLU
+
+    def __init__(self, KKT, n_var=None, col_order=None):
+        self._col_order = col_order
+        super(SuperLUFactors, self).__init__(KKT, n_var=n_var)
+
+    def factorize(self, KKT):
+        KKT = spa.csc_matrix(KKT)
+        if self._col_order is None:
+            self._lu = splu(KKT)
+        else:
+            self._lu = splu(KKT[:, self._col_order], permc_spec='NATURAL')
+        self._check_factors()
+
+    def solve(self, rhs):
+        if self._lu is None or self._col_order is None:
+            return super(SuperLUFactors, self).solve(rhs)
+        x = np.empty(rhs.shape)
+        x[self._col_order] = self._lu.solve(rhs)
+        return x
+
+    @property
+    def col_order(self):
+        """Column ordering of the KKT matrix in the factors."""
+        if self._col_order is not None:
+            return self._col_order
+        perm_c = self._lu.perm_c if self._lu is not None else self._tri[3]
+        return np.argsort(perm_c)
+
+    def refactorize(self, KKT):
+        """Reuse the column ordering of these factors."""
+        if self.singular:
+            return SuperLUFactors(KKT, n_var=self.n_var)
+        return SuperLUFactors(KKT, n_var=self.n_var,
+                              col_order=self.col_order)
+
+    def explicit_factors(self):
+        if self._tri is not None:
+            return self._tri
+        perm_c = self._lu.perm_c
+        if self._col_order is not None:
+            # Compose with the given column ordering
+            perm_c = np.empty_like(self._lu.perm_c)
+            perm_c[self._col_order] = self._lu.perm_c
+        return (self._lu.L.tocsc(), self._lu.U.tocsc(),
+                self._lu.perm_r, perm_c, None)
+
+
+class UmfpackFactors(SparseLUFactors):
+    """Sparse LU factorization with UMFPACK from scikit-umfpack."""
+
+    name = stg.UMFPACK
+
+    @classmethod
+    def is_installed(cls):
+        try:
+            import scikits.umfpack  # noqa
+        except ImportError:
+            return False
+        return True
+
+    def factorize(self, KKT):
+        from scikits.umfpack import splu as umfpack_splu
+        self._lu = umfpack_splu(spa.csc_matrix(KKT))
+        self._check_factors()
+
+    def explicit_factors(self):
+        if self._tri is not None:
+            return self._tri
+        return (self._lu.L.tocsc(), self._lu.U.tocsc(),
+                self._lu.perm_r, self._lu.perm_c, self._lu.R)
+
+
+class DenseLDLFactors(KKTFactors):
+    """Dense symmetric indefinite LDL' factorization with LAPACK
+    (Bunch-Kaufman pivoting). Faster than the sparse factorizations
+    for small KKT matrices."""
+
+    name = stg.DENSE_LDL
+
+    @classmethod
+    def is_installed(cls):
+        # The LAPACK wrappers are not available in old SciPy versions
+        try:
+            la.get_lapack_funcs(('sytrf', 'sytrs', 'sycon'))
+        except (ValueError, AttributeError):
+            return False
+        return True
+
+    def factorize(self, KKT):
+        K = KKT.toarray() if spa.issparse(KKT) else np.asarray(KKT)
+        self._ldu, self._ipiv, info = la.lapack.dsytrf(K, lower=1)
+        if info > 0:
+            raise la.LinAlgError("KKT matrix is singular")
+        rcond, _ = la.lapack.dsycon(self._ldu, self._ipiv,
+                                    np.linalg.norm(K, 1), lower=1)
+        if not rcond > stg.KKT_SINGULAR_TOL:
+            raise la.LinAlgError("KKT matrix is numerically singular")
+
+    def solve(self, rhs):
+        x, info = la.lapack.dsytrs(self._ldu, self._ipiv, rhs, lower=1)
+        return x
+
+    @property
+    def nbytes(self):
+        if self.singular:
+            return 0
+        return self._ldu.nbytes + self._ipiv.nbytes
+
+
+class QDLDLFactors(KKTFactors):
+    """Sparse LDL' factorization with QDLDL.
+
+    QDLDL factorizes only quasi-definite matrices. The KKT matrix is
+    always regularized as described in :class:`KKTFactors`.
+    The QDLDL solver can only be updated in place, which would change
+    factors shared by the solver cache. Refactorizations create new
+    factors from scratch.
+    """
+
+    name = stg.QDLDL
+    quasi_definite = True
+
+    @classmethod
+    def is_installed(cls):
+        try:
+            import qdldl  # noqa
+        except ImportError:
+            return False
+        return True
+
+    def __getstate__(self):
+        """The QDLDL solver cannot be pickled. Only the KKT matrix is
+        stored and it is factorized again when loading."""
+        state = self.__dict__.copy()
+        state.pop('_solver', None)
+        return state
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        if not self.singular:
+            self.factorize(self._regularize(self._KKT))
+
+    def factorize(self, KKT):
+        import qdldl
+        self._solver = qdldl.Solver(spa.csc_matrix(KKT))
+
+    def solve(self, rhs):
+        if rhs.ndim == 1:
+            return self._solver.solve(rhs)
+        return np.column_stack([self._solver.solve(rhs[:, j])
+                                for j in range(rhs.shape[1])])
+
+    @property
+    def nbytes(self):
+        if self.singular:
+            return 0
+        # The factors are not exposed, estimate them from the matrix
+        return int(2 * self._KKT.nnz) * (np.dtype(float).itemsize +
+                                         np.dtype(np.int64).itemsize)
+
+
+class BorderedKKTFactors(KKTFactors):
+    """
+    KKT factors derived from the factors of a base KKT matrix with
+    different constraint rows.
+
+    The KKT system with the constraint rows added to the base ones
+    and the removed base rows relaxed by free slack variables
+    (forcing their multipliers to zero) is bordered
+    :code:`[K_base W; W' 0]`. It is solved with the base factors
+    and the dense Schur complement :code:`-W' K_base^-1 W`, whose
+    dimension is the number of changed rows. Schur complements with
+    condition number above :data:`KKT_UPDATE_MAX_COND` are
+    considered singular.
+
+    The base factors are shared and not counted in :attr:`nbytes`.
+    The factor cache counts them while the base strategy is not resident.
+    Singular updates are not regularized.
+
+    Args:
+        KKT (sparse matrix): KKT matrix to solve.
+        n_var (int): Number of variables in the KKT matrix.
+        base (KKTFactors): Factors of the base KKT matrix.
+        base_rows (numpy array): Sorted keys of the base
+            constraint rows.
+        rows (numpy array): Sorted keys of the constraint rows.
+    """
+
+    regularizable = False
+
+    def __init__(self, KKT, n_var, base, base_rows, rows):
+        self.base = base
+        self._base_rows = base_rows
+        self._rows = rows
+        super(BorderedKKTFactors, self).__init__(KKT, n_var=n_var)
+
+    def factorize(self, KKT):
+        if self.base.singular:
+            raise la.LinAlgError("Base KKT matrix is singular")
+        n_var, n_base = self.n_var, self.base.n
+        rows, base_rows = self._rows, self._base_rows
+
+        # Rows kept and their position in the base rows
+        kept = np.isin(rows, base_rows)
+        self._kept = np.flatnonzero(kept)
+        self._kept_base = np.searchsorted(base_rows, rows[kept])
+        self._added = np.flatnonzero(~kept)
+        removed = np.flatnonzero(~np.isin(base_rows, rows))
+
+        # Border with the added rows and the removed rows slacks
+        n_added, n_removed = len(self._added), len(removed)
+        KKT = spa.csr_matrix(KKT)
+        W_added = spa.vstack([KKT[n_var + self._added, :n_var].T,
+                              spa.csc_matrix((n_base - n_var, n_added))])
+        W_removed = spa.csc_matrix((-np.ones(n_removed),
+                                    (n_var + removed, np.arange(n_removed))),
+                                   shape=(n_base, n_removed))
+        self._W = spa.hstack([W_added, W_removed], format='csc')
+
+        self._Z = None
+        if self._W.shape[1] == 0:
+            return
+        self._Z = solve_kkt_factors(self.base, self._W.toarray())
+        S = -(self._W.T @ self._Z)
+        if not np.all(np.isfinite(S)) or \
+                np.linalg.cond(S) > stg.KKT_UPDATE_MAX_COND:
+            raise la.LinAlgError("Schur complement is singular")
+        self._S_lu = la.lu_factor(S)
+
+    def solve(self, rhs):
+        n_var = self.n_var
+        shape = rhs.shape[1:]
+
+        # Base rhs with zero removed rows and added rows rhs
+        r_base = np.zeros((self.base.n,) + shape)
+        r_base[:n_var] = rhs[:n_var]
+        r_base[n_var + self._kept_base] = rhs[n_var + self._kept]
+        u = solve_kkt_factors(self.base, r_base)
+        if self._Z is not None:
+            r_border = np.zeros((self._W.shape[1],) + shape)
+            r_border[:len(self._added)] = rhs[n_var + self._added]
+            v = la.lu_solve(self._S_lu, r_border - self._W.T @ u)
+            u = u - self._Z @ v
+
+        sol = np.empty(rhs.shape)
+        sol[:n_var] = u[:n_var]
+        sol[n_var + self._kept] = u[n_var + self._kept_base]
+        if self._Z is not None:
+            sol[n_var + self._added] = v[:len(self._added)]
+        return sol
+
+    @property
+    def nbytes(self):
+        if self.singular:
+            return 0
+        nbytes = self._kept.nbytes + self._kept_base.nbytes + \
+            self._added.nbytes
+        if self._Z is not None:
+            nbytes += self._Z.nbytes + self._S_lu[0].nbytes + \
+                self._S_lu[1].nbytes + self._W.data.nbytes + \
+                self._W.indices.nbytes + self._W.indptr.nbytes
+        return nbytes
+
+
+class ReducedKKTFactors(KKTFactors):
+    """
+    KKT factors without the redundant constraint rows.
+
+    The linearly dependent constraint rows are found with
+    :func:`independent_rows` and removed before factorizing
+    the KKT matrix. Their multipliers are zero and their
+    right-hand side is ignored.
+
+    Args:
+        KKT (sparse matrix): KKT matrix to solve.
+        n_var (int): Number of variables in the KKT matrix.
+        backend (str): KKT backend of the reduced matrix.
+    """
+
+    regularizable = False
+
+    def __init__(self, KKT, n_var, backend=None):
+        self.backend = backend
+        super(ReducedKKTFactors, self).__init__(KKT, n_var=n_var)
+
+    def factorize(self, KKT):
+        KKT = spa.csc_matrix(KKT)
+        n_var = self.n_var
+        kept = independent_rows(KKT[n_var:, :n_var])
+        self._idx = np.concatenate([np.arange(n_var), n_var + kept])
+        stg.logger.debug("Removed %d redundant KKT rows" %
+                         (self.n - len(self._idx)))
+        self._factors = factorize_kkt_matrix(
+            KKT[self._idx][:, self._idx], backend=self.backend, n_var=n_var)
+        if self._factors.singular:
+            raise la.LinAlgError("Reduced KKT matrix is singular")
+
+    def solve(self, rhs):
+        sol = np.zeros(rhs.shape)
+        sol[self._idx] = solve_kkt_factors(self._factors, rhs[self._idx])
+        return sol
+
+    @property
+    def nbytes(self):
+        if self.singular:
+            return 0
+        return self._factors.nbytes + self._idx.nbytes
+
+
+class SymbolicKKTFactors(object):
+    """
+    Symbolic analysis of a KKT matrix to refactorize matrices with the
+    same sparsity pattern. Only the sparsity pattern and the SuperLU
+    fill-reducing column ordering are stored, not the numerical factors.
+    Matrices with a different pattern are factorized with a new ordering.
+
+    Args:
+        KKT (sparse matrix): KKT matrix to analyze.
+        n_var (int): Number of variables in the KKT matrix.
+    """
+
+    def __init__(self, KKT, n_var=None):
+        KKT = spa.csc_matrix(KKT).sorted_indices()
+        self.n = KKT.shape[0]
+        self.n_var = n_var
+        self._indptr = KKT.indptr
+        self._indices = KKT.indices
+        factors = SuperLUFactors(KKT, n_var=n_var)
+        self.col_order = None if factors.singular else factors.col_order
+
+    def _same_pattern(self, KKT):
+        return KKT.shape == (self.n, self.n) and \
+            np.array_equal(KKT.indptr, self._indptr) and \
+            np.array_equal(KKT.indices, self._indices)
+
+    def refactorize(self, KKT):
+        """Factorize a KKT matrix reusing the column ordering if it has
+        the same sparsity pattern."""
+        KKT = spa.csc_matrix(KKT).sorted_indices()
+        if self.col_order is None or not self._same_pattern(KKT):
+            return SuperLUFactors(KKT, n_var=self.n_var)
+        return SuperLUFactors(KKT, n_var=self.n_var,
+                              col_order=self.col_order)
+
+    @property
+    def nbytes(self):
+        """Memory used by the symbolic analysis in bytes."""
+        nbytes = self._indptr.nbytes + self._indices.nbytes
+        if self.col_order is not None:
+            nbytes += self.col_order.nbytes
+        return nbytes
+
+
+KKT_BACKEND_MAP = {stg.SUPERLU: SuperLUFactors,
+                   stg.UMFPACK: UmfpackFactors,
+                   stg.DENSE_LDL: DenseLDLFactors,
+                   stg.QDLDL: QDLDLFactors}
+
+
+def installed_kkt_backends():
+    """List the installed KKT linear system solvers."""
+    return [name for name, backend in KKT_BACKEND_MAP.items()
+            if backend.is_installed()]
+
+
+def select_kkt_backend(KKT, refactorize=False):
+    """Choose KKT backend from the size and density of the matrix.
+
+    Small or dense matrices use the dense LDL' factorization if the
+    LAPACK routines are available in SciPy. Otherwise, UMFPACK if
+    installed or SuperLU. If the factors are used to refactorize
+    other matrices, SuperLU is chosen since its column ordering is
+    reused, see :class:`SymbolicKKTFactors`."""
+    if refactorize:
+        return stg.SUPERLU
+    n = KKT.shape[0]
+    density = KKT.nnz / max(n * n, 1) if spa.issparse(KKT) else 1.
+    if (n <= stg.KKT_DENSE_MAX_SIZE or
+            density >= stg.KKT_DENSE_MIN_DENSITY) and \
+            DenseLDLFactors.is_installed():
+        return stg.DENSE_LDL
+    if UmfpackFactors.is_installed():
+        return stg.UMFPACK
+    return stg.SUPERLU
+
+
+def factorize_kkt_matrix(KKT, backend=None, n_var=None, refactorize=False):
+    """Factorize KKT matrix.
+
+    Args:
+        KKT (sparse matrix): KKT matrix.
+        n_var (int): Number of variables in the KKT matrix.
+            Needed by the quasi-definite factorizations.
+        backend (str): KKT backend in :data:`KKT_BACKEND_MAP`.
+            Defaults to :data:`settings.DEFAULT_KKT_BACKEND`. If None,
+            it is chosen with :func:`select_kkt_backend`.
+        refactorize (bool): The factors will be used to refactorize
+            matrices with the same sparsity pattern.
+
+    Returns: Callable :class:`KKTFactors`.
+
+    """
+    if backend is None:
+        backend = stg.DEFAULT_KKT_BACKEND
+    if backend is None:
+        backend = select_kkt_backend(KKT, refactorize=refactorize)
+    if backend not in KKT_BACKEND_MAP:
+        e.value_error("KKT backend %s not supported. Use one of %s." %
+                      (backend, list(KKT_BACKEND_MAP.keys())))
+    if not KKT_BACKEND_MAP[backend].is_installed():
+        e.value_error("KKT backend %s not installed." % backend)
+
+    return KKT_BACKEND_MAP[backend](KKT, n_var=n_var)
+
+
+def solve_kkt_factors(factors, rhs):
+    """Solve KKT system with the cached factors for a vector or
+    a matrix of right-hand sides (one per column).
+
+    Factors that do not support multiple right-hand sides
+    are applied column by column."""
+    if rhs.ndim == 1:
+        return factors(rhs)
 
     with CatchSingularMatrixWarnings():
-        return factorized(KKT)
+        try:
+            sol = factors(rhs)
+            if sol.shape == rhs.shape:
+                return sol
+        except (ValueError, TypeError):
+            pass
+
+        return np.column_stack([factors(rhs[:, j])
+                                for j in range(rhs.shape[1])])
 
 
 class KKTSolver(QpSolver):
@@ -118,7 +778,7 @@ class KKTSolver(QpSolver):
                        solver_opts,
                        solver_cache=None):
 
-        n_var = data[cps.P].shape[0]
+        n_var = len(data.get(cps.Q + "_red", data[cps.Q]))
         n_con = len(data[cps.B + "_red"])  # Only equality constraints
 
         stg.logger.debug("Solving %d x %d linear system A x = b " %
@@ -130,8 +790,16 @@ class KKTSolver(QpSolver):
             KKT, rhs = create_kkt_system(data)
 
             t_start = time.time()
-            with CatchSingularMatrixWarnings():
-                x = spsolve(KKT, rhs, use_umfpack=True)
+            x = factorize_kkt_matrix(KKT, n_var=n_var)(rhs)
+            t_end = time.time()
+
+        elif 'factors' not in solver_cache:
+            stg.logger.debug("Using KKT solver symbolic cache")
+
+            KKT, rhs = create_kkt_system(data)
+
+            t_start = time.time()
+            x = solver_cache['symbolic'].refactorize(KKT)(rhs)
             t_end = time.time()
 
         else:
@@ -147,8 +815,7 @@ class KKTSolver(QpSolver):
 
         # Get results
         results = {}
-        results['x'] = x[:n_var]
-        results['y'] = x[n_var:]
+        results['x'], results['y'] = expand_kkt_solution(data, x)
 
         if np.any(np.isnan(results['x'])):
             results['status'] = s.INFEASIBLE
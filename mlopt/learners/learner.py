@@ -54,7 +54,8 @@ class Learner(ABC):
         Sort predictions and pick best points.
 
         Use n_best classes to choose classes that
-        are most likely.
+        are most likely. Classes are sorted from the
+        most likely to the least likely.
         """
         n_points = y.shape[0]
         n_best = n_best if (n_best is not None) else self.options['n_best']
@@ -63,8 +64,8 @@ class Learner(ABC):
         idx_probs = np.empty((n_points, n_best), dtype='int')
         for i in range(n_points):
             # Get best k indices
-            # NB. Argsort sorts in reverse mode
-            idx_probs[i, :] = np.argsort(y[i, :])[-n_best:]
+            # NB. Argsort sorts in ascending order
+            idx_probs[i, :] = np.argsort(y[i, :])[::-1][:n_best]
 
         return idx_probs
 
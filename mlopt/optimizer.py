@@ -5,12 +5,18 @@ from mlopt.learners import LEARNER_MAP, installed_learners
 from mlopt.sampling import Sampler
 from mlopt.strategy import encode_strategies
 from mlopt.filter import Filter
+from mlopt.regions import CriticalRegions
+from mlopt.results import ResultBatch
+from mlopt.cache import FactorCache, cache_entry_nbytes
 from mlopt import error as e
 from mlopt.utils import n_features, accuracy, suboptimality
 from mlopt import utils as u
-from mlopt.kkt import create_kkt_matrix, factorize_kkt_matrix
+from mlopt.kkt import BorderedKKTFactors, ReducedKKTFactors, \
+    SymbolicKKTFactors, create_kkt_matrix, factorize_kkt_matrix, \
+    solve_kkt_factors
 from mlopt.utils import pandas2array
 from cvxpy import Minimize, Maximize
+import cvxpy.settings as cps
 import numpy as np
 import os
 from glob import glob
@@ -22,6 +28,71 @@ from tqdm.auto import tqdm
 from time import time
 
 
+def factorize_strategy(problem, strategy, theta, policy=False, backend=None,
+                       base=None):
+    """
+    Compute the cache entry with the KKT factors
+    (and the affine policy) of a strategy.
+
+    If the parameters enter the problem matrices, only the symbolic
+    analysis is stored as 'symbolic' with :class:`SymbolicKKTFactors`
+    and the KKT matrix is refactorized at each point with SuperLU.
+
+    If base is a tuple with a strategy and its factors, the factors
+    are derived from them with :class:`BorderedKKTFactors`. If the
+    update is singular, the KKT matrix is factorized.
+
+    If the KKT matrix is singular, the redundant constraint rows are
+    removed with :class:`ReducedKKTFactors`. If it is still singular,
+    the regularized factors are kept.
+    """
+
+    # Populate with a parameter giving that strategy
+    problem.populate(theta)
+
+    # Get problem data
+    data, inverse_data, solving_chain = problem._get_problem_data()
+
+    # Apply strategy
+    strategy.apply(data, inverse_data[-1])
+
+    # Get KKT matrix
+    KKT_mat = create_kkt_matrix(data)
+    n_var_kkt = data.get(cps.P + "_red", data[cps.P]).shape[0]
+    if problem.parameters_in_matrices:
+        return {'symbolic': SymbolicKKTFactors(KKT_mat, n_var=n_var_kkt)}
+
+    solve_kkt = None
+    if base is not None:
+        base_strategy, base_factors = base
+        solve_kkt = BorderedKKTFactors(KKT_mat, n_var_kkt, base_factors,
+                                       base_strategy.kkt_rows(data),
+                                       strategy.kkt_rows(data))
+    if solve_kkt is None or solve_kkt.singular:
+        solve_kkt = factorize_kkt_matrix(KKT_mat, backend=backend,
+                                         n_var=n_var_kkt)
+    if not solve_kkt.quasi_definite and \
+            (solve_kkt.singular or solve_kkt.regularized):
+        reduced = ReducedKKTFactors(KKT_mat, n_var_kkt, backend=backend)
+        if not reduced.singular:
+            solve_kkt = reduced
+
+    cache = {}
+    cache['factors'] = solve_kkt
+    if policy:
+        cache['policy'] = problem.affine_policy(
+            strategy, solve_kkt, sparse=(policy == 'sparse'))
+
+    return cache
+
+
+def _factorize_strategy_worker(strategy, theta, policy, backend, problem):
+    """Compute the cache entry of a strategy with the problem held by
+    a worker process of :class:`ProblemPool`."""
+    return factorize_strategy(problem, strategy, theta, policy=policy,
+                              backend=backend)
+
+
 class Optimizer(object):
     """
     Machine Learning Optimizer class.
@@ -33,6 +104,7 @@ class Optimizer(object):
                  log_level=None,
                  parallel=True,
                  tight_constraints=True,
+                 kkt_backend=None,
                  **solver_options):
         """
         Inizialize optimizer.
@@ -43,6 +115,10 @@ class Optimizer(object):
             Problem in CVXPY format.
         name : str
             Problem name.
+        kkt_backend : str, optional
+            Linear system solver to factorize the KKT matrices of the
+            strategies. See :data:`mlopt.kkt.KKT_BACKEND_MAP`.
+            Defaults to automatic selection by size and density.
         solver_options : dict, optional
             A dict of options for the internal solver.
         """
@@ -55,6 +131,10 @@ class Optimizer(object):
                                 tight_constraints=tight_constraints,
                                 **solver_options)
         self._solver_cache = None
+        self._regions = None
+        self._idx_representatives = None
+        self._theta_representatives = None  # Saved with the cache
+        self.kkt_backend = kkt_backend
         self.name = name
         self._learner = None
         self.encoding = None
@@ -102,6 +182,16 @@ class Optimizer(object):
         self.X_train, self.y_train, self.obj_train, self.encoding = \
             self._sampler.sample(parallel=parallel)
 
+        # Drop points without strategy (failed solves)
+        failed = np.flatnonzero(self.y_train < 0)
+        if len(failed):
+            e.warning("Discarding %d samples without strategy at "
+                      "indices %s" % (len(failed), list(failed)))
+            keep = self.y_train >= 0
+            self.X_train = self.X_train[keep].reset_index(drop=True)
+            self.y_train = self.y_train[keep]
+            self.obj_train = np.asarray(self.obj_train)[keep]
+
     def save_training_data(self, file_name, delete_existing=False):
         """
         Save training data to file.
@@ -144,8 +234,11 @@ class Optimizer(object):
                          '_problem': self._problem,
                          'encoding': self.encoding}
 
-            # if hasattr(self, '_solver_cache'):
-            #     data_dict['_solver_cache'] = self._solver_cache
+            # Factors and policies are stored explicitly
+            if self._solver_cache:
+                data_dict['_solver_cache'] = self._solver_cache
+            if getattr(self, '_regions', None) is not None:
+                data_dict['_regions'] = self._regions
 
             # Store strategy filter
             if hasattr(self, '_filter'):
@@ -187,6 +280,9 @@ class Optimizer(object):
 
         if ('_solver_cache' in data_dict):
             self._solver_cache = data_dict['_solver_cache']
+            self._solver_cache.bind(self._factorize_strategy)
+        if ('_regions' in data_dict):
+            self._regions = data_dict['_regions']
 
         # Full strategies backup after filtering
         if ('_filter' in data_dict):
@@ -216,6 +312,9 @@ class Optimizer(object):
             self.X_train = X
             self.y_train = None
             self.encoding = None
+            self._solver_cache = None
+            self._regions = None
+            self._idx_representatives = None
 
             # Encode training strategies by solving
             # the problem for all the points
@@ -263,13 +362,12 @@ class Optimizer(object):
             if filter_strategies:
                 self.filter_strategies(parallel=parallel)
 
-        # Add factorization faching if
-        # 1. Problem is MIQP
-        # 2. Parameters do not enter in matrices
+        # Add factorization caching if problem is MIQP.
+        # If parameters enter in matrices, only the symbolic
+        # analysis of the factorization is cached.
         if self._problem.is_qp() and \
-                (self._solver_cache is None) and \
-                not self._problem.parameters_in_matrices:
-            self.cache_factors()
+                (self._solver_cache is None):
+            self.cache_factors(parallel=parallel)
 
     def filter_strategies(self, parallel=True, **filter_options):
         # Store full non filtered strategies
@@ -286,6 +384,11 @@ class Optimizer(object):
         self.y_train, self.encoding = \
             self._filter.filter(parallel=parallel, **filter_options)
 
+        # Cached factors refer to the previous strategies
+        self._solver_cache = None
+        self._regions = None
+        self._idx_representatives = None
+
     def train(self, X=None,
               sampling_fn=None,
               parallel=True,
@@ -332,71 +435,253 @@ class Optimizer(object):
         self._learner.train(pandas2array(self.X_train),
                             self.y_train)
 
-    def cache_factors(self):
-        """Cache linear system solver factorizations"""
-
-        self._solver_cache = []
-        stg.logger.info("Caching KKT solver factors for each strategy ")
-        for strategy_idx in tqdm(range(self.n_strategies)):
-
-            # Get a parameter giving that strategy
-            strategy = self.encoding[strategy_idx]
-            idx_param = np.where(self.y_train == strategy_idx)[0]
-            theta = self.X_train.iloc[idx_param[0]]
-
-            # Populate
-            self._problem.populate(theta)
+    def cache_factors(self, policy=False, lazy=False, max_bytes=None,
+                      eviction=None, prewarm=None, parallel=True,
+                      batch_size=stg.JOBLIB_BATCH_SIZE,
+                      updates=stg.KKT_UPDATES):
+        """
+        Cache linear system solver factorizations
 
-            # Get problem data
-            data, inverse_data, solving_chain = \
-                self._problem._get_problem_data()
+        Parameters
+        ----------
+        policy : bool or str, optional
+            Precompute the explicit affine policy of each strategy
+            mapping the parameters to the solution and the cost.
+            It can be False, True (same as 'dense'), 'dense' or 'sparse'.
+            Defaults to False.
+        lazy : bool, optional
+            Factorize each strategy on first use instead of all of them
+            now. Defaults to False.
+        max_bytes : int, optional
+            Memory budget of the cache in bytes. Only the most frequent
+            strategies fitting in it are factorized now. Factors are
+            evicted when exceeding it on use. Defaults to
+            :data:`settings.FACTOR_CACHE_MAX_BYTES`.
+        eviction : str, optional
+            Eviction rule, 'lru' or 'lfu'. Defaults to
+            :data:`settings.FACTOR_CACHE_EVICTION`.
+        prewarm : int, optional
+            With lazy caching, factorize now the prewarm most
+            frequent strategies in the training data.
+        parallel : bool, optional
+            Factorize the strategies in parallel processes.
+            Defaults to True.
+        batch_size : int, optional
+            Number of strategies sent to each process at once.
+            Defaults to :data:`settings.JOBLIB_BATCH_SIZE`.
+        updates : bool, optional
+            Derive the factors of the strategies from the factors of a
+            base strategy differing by at most
+            :data:`settings.KKT_UPDATE_MAX_RANK` tight constraints.
+            Only the base strategies are factorized in parallel.
+            Defaults to :data:`settings.KKT_UPDATES`.
+        """
+        if policy and not self._problem.parameter_map_valid:
+            e.value_error("Affine policies can be computed only "
+                          "when parameters appear in the vectors.")
+
+        self._solver_cache = FactorCache(self.n_strategies,
+                                         self._factorize_strategy,
+                                         policy=policy,
+                                         max_bytes=max_bytes,
+                                         eviction=eviction)
+
+        # Strategies from the most frequent
+        y = self.y_train[self.y_train >= 0]
+        labels = np.argsort(np.bincount(y, minlength=self.n_strategies),
+                            kind='stable')[::-1]
+        if updates and not self._problem.parameters_in_matrices:
+            self._solver_cache.bases = self._update_bases(labels)
+        if lazy:
+            labels = labels[:prewarm or 0]
+
+        n_jobs = u.get_n_processes(len(labels)) if parallel else 1
+
+        stg.logger.info("Caching KKT solver factors for %d strategies "
+                        "(n_jobs = %d)" % (len(labels), n_jobs))
+
+        if n_jobs > 1 and \
+                not self._parallel_prewarm(labels, n_jobs, batch_size):
+            return  # Byte budget filled
+
+        # Remaining strategies (derived from the bases)
+        self._solver_cache.prewarm(tqdm(labels))
+
+    def _parallel_prewarm(self, labels, n_jobs, batch_size):
+        """Factorize the strategies in labels (except the ones derived
+        from a base) in the problem worker processes, in order until the
+        byte budget is filled. With a budget, each chunk of labels is cut
+        to the number of entries expected to fit from the size of the
+        entries computed so far. Factors are pickled back from the
+        processes.
 
-            # Apply strategy
-            strategy.apply(data, inverse_data[-1])
+        Returns
+        -------
+        bool
+            True if all the strategies fit in the byte budget.
+        """
+        cache = self._solver_cache
+        if cache.bases is not None:
+            labels = labels[cache.bases[labels] < 0]
+        backend = getattr(self, 'kkt_backend', None)
+        pool = self._problem.worker_pool(n_jobs)
+        chunk_size = n_jobs * batch_size
+        entry_bytes = []
+        start = 0
+        while start < len(labels):
+            chunk = labels[start:start + chunk_size]
+            if cache.max_bytes is not None:
+                if entry_bytes:
+                    n_fit = np.ceil((cache.max_bytes - cache.resident_bytes)
+                                    / np.mean(entry_bytes))
+                else:
+                    n_fit = n_jobs  # Estimate entry size first
+                chunk = chunk[:max(int(n_fit), 1)]
+            entries = pool.map(
+                _factorize_strategy_worker,
+                [(self.encoding[label], self._representative_theta(label),
+                  cache.policy, backend) for label in chunk],
+                solver_options=self._problem.solver_options,
+                chunk_size=batch_size)
+            for label, entry in zip(chunk, entries):
+                entry_bytes.append(cache_entry_nbytes(entry))
+                if not cache.fits(entry):
+                    return False
+                cache.add(label, entry)
+            start += len(chunk)
+        return True
+
+    def _update_bases(self, labels):
+        """
+        Choose greedily in the order of labels the base strategy of
+        each strategy as the closest previous base differing by at
+        most :data:`settings.KKT_UPDATE_MAX_RANK` tight constraints.
+        Strategies without a close base become bases.
 
-            # Old
-            #  self._problem.populate(theta)
-            #
-            #  self._problem._relax_disc_var()
-            #
-            #  reduced_problem = \
-            #      self._problem._construct_reduced_problem(strategy)
-            #
-            #  data, full_chain, inv_data = \
-            #      reduced_problem.get_problem_data(solver=KKT)
+        Returns
+        -------
+        numpy array
+            Base of each strategy. -1 for the bases.
+        """
+        bases = np.full(self.n_strategies, -1, dtype=int)
+        base_labels = []
+        for label in labels:
+            if base_labels:
+                rank = self.encoding[[label]].distance_matrix(
+                    self.encoding[base_labels],
+                    int_vars=False, normalize=False)[0]
+                j = np.argmin(rank)
+                if rank[j] <= stg.KKT_UPDATE_MAX_RANK:
+                    bases[label] = base_labels[j]
+                    continue
+            base_labels.append(label)
+
+        stg.logger.info("Factorizing %d base strategies out of %d" %
+                        (len(base_labels), len(labels)))
+        return bases
+
+    def _representative_theta(self, label):
+        """Parameters of a training point of a strategy to compute its
+        factors. Without training data, e.g., after loading, the
+        representatives saved with the optimizer are used."""
+        if self.X_train is not None:
+            return self.X_train.iloc[self._representatives()[label]]
+        theta = getattr(self, '_theta_representatives', None)
+        if theta is None:
+            e.value_error("No training data to compute the factors "
+                          "of strategy %d." % label)
+        return theta.iloc[label]
+
+    def _representatives(self):
+        """Index of a training point for each strategy."""
+        if getattr(self, '_idx_representatives', None) is None:
+            labels, idx = np.unique(self.y_train, return_index=True)
+            idx_theta = np.full(self.n_strategies, -1, dtype=int)
+            idx_theta[labels[labels >= 0]] = idx[labels >= 0]
+            self._idx_representatives = idx_theta
+        return self._idx_representatives
+
+    def _factorize_strategy(self, strategy_idx, policy=False):
+        """Compute the cache entry of a strategy. The factors are derived
+        from the factors of its base strategy if they are cached."""
+        theta = self._representative_theta(strategy_idx)
+        base = None
+        bases = getattr(self._solver_cache, 'bases', None)
+        if bases is not None and bases[strategy_idx] >= 0:
+            base_entry = self._solver_cache.peek(bases[strategy_idx])
+            if base_entry is not None:
+                base = (self.encoding[bases[strategy_idx]],
+                        base_entry['factors'])
+        return factorize_strategy(self._problem, self.encoding[strategy_idx],
+                                  theta, policy=policy,
+                                  backend=getattr(self, 'kkt_backend', None),
+                                  base=base)
+
+    def _cache_has_policy(self):
+        """Check if the solver cache contains the affine policies."""
+        return bool(self._solver_cache) and \
+            bool(getattr(self._solver_cache, 'policy', False))
+
+    def build_regions(self, margin=0.1):
+        """
+        Build the critical regions index to locate the optimal
+        strategy of a point before calling the learner.
 
-            # Get KKT matrix
-            KKT_mat = create_kkt_matrix(data)
-            solve_kkt = factorize_kkt_matrix(KKT_mat)
+        It requires continuous problems with parameters only in the
+        vectors. Affine policies are cached if not present.
 
-            cache = {}
-            cache['factors'] = solve_kkt
-            #  cache['inverse_data'] = inverse_data
-            #  cache['chain'] = solving_chain
+        Parameters
+        ----------
+        margin : float, optional
+            Relative margin to enlarge the regions bounding boxes
+            around the training points. Defaults to 0.1.
+        """
+        if not self._cache_has_policy():
+            self.cache_factors(policy=True)
 
-            self._solver_cache += [cache]
+        stg.logger.info("Building critical regions index")
+        self._regions = CriticalRegions.from_policies(
+            self._problem, self.encoding, self._solver_cache,
+            self._problem.parameter_vectors(self.X_train),
+            np.asarray(self.y_train), margin=margin)
 
     def choose_best(self, problem_data, labels, parallel=False,
-                    batch_size=stg.JOBLIB_BATCH_SIZE, use_cache=True):
+                    batch_size=stg.JOBLIB_BATCH_SIZE, use_cache=True,
+                    early_exit=True):
         """
         Choose best strategy between provided ones
 
+        With the solver cache, the candidates are evaluated together
+        with stacked KKT solves in the current process and the
+        arguments :code:`parallel` and :code:`batch_size` are ignored.
+
         Parameters
         ----------
+        problem_data : tuple
+            Problem data, inverse data and solving chain.
         labels : list
-            Strategy labels to compare.
+            Strategy labels to compare from the most likely.
         parallel : bool, optional
-            Perform `n_best` strategies evaluation in parallel.
-            True by default.
+            Without the solver cache, perform `n_best` strategies
+            evaluation in parallel. False by default.
+        batch_size : int, optional
+            Without the solver cache, number of strategies sent to each
+            process at once. Defaults to
+            :data:`settings.JOBLIB_BATCH_SIZE`.
         use_cache : bool, optional
             Use solver cache if available. True by default.
+        early_exit : bool, optional
+            With the solver cache, stop at the first strategy
+            whose solution is certified optimal by its dual
+            variables. Only for continuous problems.
+            True by default.
 
         Returns
         -------
         dict
             Results as a dictionary.
         """
-        n_best = self._learner.options['n_best']
+        n_best = len(labels)
 
         # For each n_best classes get x, y, time and store the best one
         x = []
@@ -406,17 +691,32 @@ class Optimizer(object):
 
         strategies = [self.encoding[label] for label in labels]
 
-        # Cache is a list of solver caches to pass
-        cache = [None] * n_best
         if self._solver_cache and use_cache:
+            # Evaluate all candidates with the cached factors and
+            # unpack only the best one
             cache = [self._solver_cache[label] for label in labels]
+            problem = self._problem
+            candidates = problem.evaluate_strategies(
+                problem_data, strategies, cache, early_exit=early_exit)
+            if candidates['certified']:
+                idx_pick = len(candidates['cost']) - 1
+            else:
+                idx_pick = self._pick_best(candidates['cost'],
+                                           candidates['infeasibility'])
+            return problem.unpack_strategy_solution(
+                problem_data, strategies[idx_pick],
+                candidates['x'][:, idx_pick], candidates['y'][idx_pick],
+                candidates['time'])
+
+        cache = [None] * n_best
 
         n_jobs = u.get_n_processes(n_best) if parallel else 1
 
         results = Parallel(n_jobs=n_jobs, batch_size=batch_size)(
             delayed(self._problem.solve)(problem_data,
                                          strategy=strategies[j],
-                                         cache=cache[j])
+                                         cache=cache[j],
+                                         need_strategy=False)
             for j in range(n_best))
 
         x = [r["x"] for r in results]
@@ -427,6 +727,20 @@ class Optimizer(object):
         # Pick best class between k ones
         infeas = np.array(infeas)
         cost = np.array(cost)
+        idx_pick = self._pick_best(cost, infeas)
+
+        # Store values we are interested in
+        result = {}
+        result['x'] = x[idx_pick]
+        result['time'] = np.sum(time)
+        result['strategy'] = strategies[idx_pick]
+        result['cost'] = cost[idx_pick]
+        result['infeasibility'] = infeas[idx_pick]
+
+        return result
+
+    def _pick_best(self, cost, infeas):
+        """Index of the best candidate given their cost and infeasibility"""
         idx_filter = np.where(infeas <= stg.INFEAS_TOL)[0]
         if len(idx_filter) > 0:
             # Case 1: Feasible points
@@ -443,20 +757,81 @@ class Optimizer(object):
             # -> Get solution with minimum infeasibility
             idx_pick = np.argmin(infeas)
 
-        # Store values we are interested in
+        return idx_pick
+
+    def choose_best_policy(self, theta, labels):
+        """
+        Choose best strategy between provided ones using the cached
+        affine policies. No CVXPY problem data and no linear system
+        solutions are computed.
+
+        Parameters
+        ----------
+        theta : numpy array
+            Parameter vector from :meth:`Problem.parameter_vectors`.
+        labels : list
+            Strategy labels to compare.
+
+        Returns
+        -------
+        dict
+            Results as a dictionary.
+        """
+        t_start = time()
+        problem = self._problem
+        data = problem._data
+        vectors = problem.problem_data_batch(theta[None, :])
+        data = {cps.A: data[cps.A], cps.B: vectors[cps.B][0],
+                cps.F: data[cps.F], cps.G: vectors[cps.G][0]}
+
+        n_best = len(labels)
+        x = []
+        cost = np.empty(n_best)
+        infeas = np.empty(n_best)
+        for j, label in enumerate(labels):
+            policy = self._solver_cache[label]['policy']
+            x.append(policy['x'] @ theta)
+            cost[j] = theta @ policy['cost'] @ theta
+            infeas[j] = problem.infeasibility(x[j], data)
+
+        idx_pick = self._pick_best(cost, infeas)
+
         result = {}
         result['x'] = x[idx_pick]
-        result['time'] = np.sum(time)
-        result['strategy'] = strategies[idx_pick]
+        result['time'] = time() - t_start
+        result['strategy'] = self.encoding[labels[idx_pick]]
         result['cost'] = cost[idx_pick]
         result['infeasibility'] = infeas[idx_pick]
 
         return result
 
+    def _predict(self, X, theta=None):
+        """
+        Predict the strategy labels to evaluate for each point, from
+        the most likely. If the critical regions have been built and
+        the parameter vectors theta are passed, points located in a
+        region get only its label and the learner predicts
+        the remaining ones.
+        """
+        X_pred = pandas2array(X)
+        if theta is None or self._regions is None:
+            return self._learner.predict(X_pred)
+
+        located = self._regions.locate(theta)
+        classes = [[label] for label in located]
+        idx_predict = np.where(located < 0)[0]
+        if len(idx_predict):
+            classes_predict = self._learner.predict(X_pred[idx_predict])
+            for k, i in enumerate(idx_predict):
+                classes[i] = classes_predict[k]
+        return classes
+
     def solve(self, X,
               message="Predict optimal solution",
               use_cache=True,
               verbose=False,
+              batch=False,
+              result_batch=False,
               ):
         """
         Predict optimal solution given the parameters X.
@@ -467,10 +842,17 @@ class Optimizer(object):
             Data points.
         use_cache : bool, optional
             Use solver cache?  Defaults to True.
+        batch : bool, optional
+            Evaluate all the points together grouped by strategy
+            with the cached factors. See :meth:`solve_batch`.
+            Defaults to False.
+        result_batch : bool, optional
+            Return results stored as arrays in a :class:`ResultBatch`.
+            Always True with batch. Defaults to False.
 
         Returns
         -------
-        list
+        list or ResultBatch
             List of result dictionaries.
         """
 
@@ -478,6 +860,9 @@ class Optimizer(object):
             X = pd.DataFrame(X).transpose()
         n_points = len(X)
 
+        if batch:
+            return self.solve_batch(X)
+
         if use_cache and not self._solver_cache:
             e.warning("Solver cache requested but the cache has "
                       "not been computed for this problem. "
@@ -490,10 +875,14 @@ class Optimizer(object):
         # Define array of results to return
         results = []
 
+        # Use affine policies if they have been computed
+        use_policy = use_cache and self._cache_has_policy()
+        if use_policy:
+            theta = self._problem.parameter_vectors(X)
+
         # Predict best n_best classes for all the points
-        X_pred = pandas2array(X)
         t_start = time()
-        classes = self._learner.predict(X_pred)
+        classes = self._predict(X, theta if use_policy else None)
         t_predict = (time() - t_start) / n_points  # Average predict time
 
         if n_points > 1:
@@ -505,11 +894,16 @@ class Optimizer(object):
 
         for i in ran:
 
+            if use_policy:
+                results.append(self.choose_best_policy(theta[i],
+                                                       classes[i]))
+                continue
+
             # Populate problem with i-th data point
             self._problem.populate(X.iloc[i])
             problem_data = self._problem._get_problem_data()
             results.append(self.choose_best(problem_data,
-                                            classes[i, :],
+                                            classes[i],
                                             use_cache=use_cache))
 
         # Append predict time
@@ -518,11 +912,107 @@ class Optimizer(object):
             r['solve_time'] = r['time']
             r['time'] = r['pred_time'] + r['solve_time']
 
+        if result_batch:
+            return ResultBatch.from_results(results,
+                                            n_var=self._problem.n_var)
+
         if len(results) == 1:
             results = results[0]
 
         return results
 
+    def solve_batch(self, X):
+        """
+        Predict optimal solutions for all the points in X together.
+
+        The (point, candidate strategy) pairs are grouped by strategy
+        and each cached factorization solves the KKT systems of all its
+        points at once. Cost and infeasibility are computed for all the
+        pairs together. Parameters must appear only in the vectors.
+
+        Parameters
+        ----------
+        X : pandas DataFrame or Series
+            Data points.
+
+        Returns
+        -------
+        ResultBatch
+            Results with strategy labels referring to the encoding.
+            Times are averaged over the points.
+        """
+        if isinstance(X, pd.Series):
+            X = pd.DataFrame(X).transpose()
+        if not self._solver_cache or \
+                not self._problem.parameter_map_valid:
+            e.value_error("Batch solve requires the solver cache and "
+                          "parameters only in the problem vectors.")
+        problem = self._problem
+        data = problem._data
+        n_points = len(X)
+
+        # Problem vectors of all the points
+        theta = problem.parameter_vectors(X)
+        vectors = problem.problem_data_batch(theta)
+        q, b, g = vectors[cps.Q].T, vectors[cps.B].T, vectors[cps.G].T
+
+        t_start = time()
+        classes = self._predict(X, theta)
+        t_predict = time() - t_start
+
+        # Candidate pairs padded with label -1
+        n_cand = max(len(c) for c in classes)
+        labels = np.full((n_points, n_cand), -1, dtype=int)
+        for i, c in enumerate(classes):
+            labels[i, :len(c)] = c
+
+        # Best candidate for each point so far
+        t_start = time()
+        x = np.full((n_points, problem.n_var), np.nan)
+        cost = np.full(n_points, np.inf)
+        infeas = np.full(n_points, np.inf)
+        strategy = np.full(n_points, -1, dtype=int)
+        sign = -1 if problem.sense() == Maximize else 1
+        for label in np.unique(labels[labels >= 0]):
+            idx = np.where(np.any(labels == label, axis=1))[0]
+            q_s = q[:, idx]
+            strategy_s = self.encoding[label]
+            rhs = strategy_s.kkt_rhs(data, q_s, b[:, idx], g[:, idx])
+            x_s, _ = strategy_s.kkt_solution(
+                data, solve_kkt_factors(self._solver_cache[label]['factors'],
+                                        rhs))
+
+            # Cost of the canonical minimization problem
+            # (opposite of the objective for maximization problems)
+            cost_s = .5 * np.sum(x_s * (data[cps.P] @ x_s), axis=0) + \
+                np.sum(q_s * x_s, axis=0) + vectors[cps.OFFSET][idx]
+            infeas_s = problem.infeasibility(
+                x_s, {cps.A: data[cps.A], cps.B: b[:, idx],
+                      cps.F: data[cps.F], cps.G: g[:, idx]})
+            singular = np.any(np.isnan(x_s), axis=0)
+            cost_s[singular], infeas_s[singular] = np.inf, np.inf
+
+            # Prefer feasible candidates with lower cost. Otherwise
+            # prefer candidates with lower infeasibility.
+            feas_s = infeas_s <= stg.INFEAS_TOL
+            feas = infeas[idx] <= stg.INFEAS_TOL
+            better = np.where(feas_s,
+                              ~feas | (cost_s < cost[idx]),
+                              ~feas & (infeas_s < infeas[idx]))
+            idx_better = idx[better]
+            x[idx_better] = x_s[:, better].T
+            cost[idx_better] = cost_s[better]
+            infeas[idx_better] = infeas_s[better]
+            strategy[idx_better] = label
+        t_solve = time() - t_start
+
+        pred_time = np.full(n_points, t_predict / n_points)
+        solve_time = np.full(n_points, t_solve / n_points)
+
+        return ResultBatch(x, sign * cost, infeas, pred_time + solve_time,
+                           labels=strategy, strategies=self.encoding,
+                           pred_time=pred_time, solve_time=solve_time)
+
     def save(self, file_name, delete_existing=False):
         """
         Save optimizer to a specific tar.gz file.
@@ -568,11 +1058,16 @@ class Optimizer(object):
             with open(os.path.join(tmpdir, "optimizer.pkl"), 'wb') \
                     as optimizer:
                 file_dict = {'_problem': self._problem,
-                             # '_solver_cache': self._solver_cache,  # Cannot pickle
+                             '_solver_cache': self._solver_cache,
+                             '_regions': getattr(self, '_regions', None),
+                             'kkt_backend': getattr(self, 'kkt_backend',
+                                                    None),
                              'learner_name': self._learner.name,
                              'learner_options': self._learner.options,
                              'learner_best_params': self._learner.best_params,
-                             'encoding': self.encoding
+                             'encoding': self.encoding,
+                             'theta_representatives':
+                             self._saved_representatives(),
                              }
                 pkl.dump(file_dict, optimizer)
 
@@ -582,6 +1077,14 @@ class Optimizer(object):
                 tar.add(f, os.path.basename(f))
             tar.close()
 
+    def _saved_representatives(self):
+        """Parameters of a training point for each strategy to compute
+        the factors missing from the cache after loading."""
+        if self.X_train is None:
+            return getattr(self, '_theta_representatives', None)
+        return self.X_train.iloc[self._representatives()].reset_index(
+            drop=True)
+
     @classmethod
     def from_file(cls, file_name):
         """
@@ -617,10 +1120,19 @@ class Optimizer(object):
 
             # Create optimizer using loaded dict
             problem = optimizer_dict['_problem'].cvxpy_problem
-            optimizer = cls(problem, name=name)
+            optimizer = cls(problem, name=name,
+                            kkt_backend=optimizer_dict.get('kkt_backend'))
 
             # Assign strategies encoding
             optimizer.encoding = optimizer_dict['encoding']
+
+            # Cached factors and policies do not need to be recomputed
+            optimizer._solver_cache = optimizer_dict.get('_solver_cache')
+            optimizer._theta_representatives = \
+                optimizer_dict.get('theta_representatives')
+            if optimizer._solver_cache is not None:
+                optimizer._solver_cache.bind(optimizer._factorize_strategy)
+            optimizer._regions = optimizer_dict.get('_regions')
             optimizer._sampler = optimizer_dict.get('_sampler', None)
 
             # Load learner
@@ -667,7 +1179,8 @@ class Optimizer(object):
             results_test = self._problem.solve_parametric(
                 theta, parallel=parallel, message="Compute " +
                                                   "tight constraints " +
-                                                  "for test set")
+                                                  "for test set",
+                result_batch=True)
 
         if results_heuristic is None:
             self._problem.solver_options['MIPGap'] = 0.1  # 10% MIP Gap
@@ -677,26 +1190,36 @@ class Optimizer(object):
                 theta, parallel=parallel, message="Compute " +
                                                   "tight constraints " +
                                                   "with heuristic MIP Gap 10 %%" +
-                                                  "for test set")
+                                                  "for test set",
+                result_batch=True, need_strategy=False)
 
             self._problem.solver_options.pop('MIPGap')  # Remove MIP Gap option
 
-        time_test = [r['time'] for r in results_test]
-        cost_test = [r['cost'] for r in results_test]
+        n_var = self._problem.n_var
+        if not isinstance(results_test, ResultBatch):
+            results_test = ResultBatch.from_results(results_test,
+                                                    n_var=n_var)
+        if not isinstance(results_heuristic, ResultBatch):
+            results_heuristic = ResultBatch.from_results(results_heuristic,
+                                                         n_var=n_var)
+
+        time_test = results_test.time
+        cost_test = results_test.cost
 
-        time_heuristic = [r['time'] for r in results_heuristic]
-        cost_heuristic = [r['cost'] for r in results_heuristic]
+        time_heuristic = results_heuristic.time
+        cost_heuristic = results_heuristic.cost
 
         # Get predicted strategy for each point
         results_pred = self.solve(theta,
                                   message="Predict tight constraints for " +
                                   "test set",
-                                  use_cache=use_cache)
-        time_pred = [r['time'] for r in results_pred]
-        solve_time_pred = [r['solve_time'] for r in results_pred]
-        pred_time_pred = [r['pred_time'] for r in results_pred]
-        cost_pred = [r['cost'] for r in results_pred]
-        infeas = np.array([r['infeasibility'] for r in results_pred])
+                                  use_cache=use_cache,
+                                  result_batch=True)
+        time_pred = results_pred.time
+        solve_time_pred = results_pred.solve_time
+        pred_time_pred = results_pred.pred_time
+        cost_pred = results_pred.cost
+        infeas = results_pred.infeasibility
 
         n_test = len(theta)
         n_train = self._learner.n_train  # Number of training samples
@@ -0,0 +1,91 @@
+from concurrent.futures import ProcessPoolExecutor
+import pickle
+import weakref
+from mlopt import settings as stg
+from tqdm.auto import tqdm
+
+# Problem loaded in the worker process by the pool initializer
+_problem = None
+
+
+def _init_worker(problem_bytes):
+    global _problem
+    _problem = pickle.loads(problem_bytes)
+
+
+def _map_chunk(fn, chunk, solver_options):
+    """Evaluate fn on the chunk of arguments with the worker problem."""
+    _problem.solver_options = solver_options
+    return [fn(*args, _problem) for args in chunk]
+
+
+class ProblemPool(object):
+    """
+    Persistent pool of worker processes holding a copy of the problem.
+
+    The problem is pickled once and sent to each worker by the pool
+    initializer. The pool keeps no reference to the problem.
+    Each task sends only a chunk of arguments and the solver options
+    of the problem to keep the workers in sync. The worker processes
+    are terminated by :meth:`shutdown`, when the pool is garbage
+    collected or at interpreter exit.
+
+    Parameters
+    ----------
+    problem : Problem
+        Optimization problem.
+    n_jobs : int
+        Number of worker processes.
+    """
+
+    def __init__(self, problem, n_jobs):
+        self.n_jobs = n_jobs
+        self._executor = ProcessPoolExecutor(
+            max_workers=n_jobs, initializer=_init_worker,
+            initargs=(pickle.dumps(problem),))
+        self._finalizer = weakref.finalize(self, self._executor.shutdown,
+                                           wait=False)
+
+    @property
+    def broken(self):
+        """Check if a worker process terminated abruptly."""
+        return bool(getattr(self._executor, '_broken', False))
+
+    def map(self, fn, args, solver_options=None,
+            chunk_size=stg.JOBLIB_BATCH_SIZE):
+        """
+        Evaluate :code:`fn(*a, problem)` for each tuple :code:`a` in args
+        in the worker processes.
+
+        Parameters
+        ----------
+        fn : function
+            Module level function taking the problem as last argument.
+        args : list
+            Tuples of arguments.
+        solver_options : dict, optional
+            Solver options of the problem. Defaults to no options.
+        chunk_size : int, optional
+            Number of evaluations sent to a worker at once.
+            Defaults to :data:`settings.JOBLIB_BATCH_SIZE`.
+
+        Returns
+        -------
+        list
+            Results in the order of args.
+        """
+        if solver_options is None:
+            solver_options = {}
+        futures = [self._executor.submit(_map_chunk, fn,
+                                         args[i:i + chunk_size],
+                                         solver_options)
+                   for i in range(0, len(args), chunk_size)]
+        results = []
+        for future in tqdm(futures):
+            results.extend(future.result())
+        return results
+
+    def shutdown(self):
+        """Terminate the worker processes."""
+        self._finalizer.detach()
+        self._executor.shutdown()
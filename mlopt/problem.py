@@ -1,9 +1,12 @@
-from joblib import Parallel, delayed
 import numpy as np
+import pandas as pd
 # Mlopt stuff
 from mlopt.strategy import Strategy
+from mlopt.results import ResultBatch
+from mlopt.pool import ProblemPool
 from mlopt import settings as stg
-from mlopt.kkt import KKTSolver
+from mlopt.kkt import KKTSolver, CatchSingularMatrixWarnings, \
+    create_kkt_matrix
 from mlopt import utils as u
 from mlopt import error as e
 # Import cvxpy and constraint types
@@ -11,10 +14,18 @@ import cvxpy as cp
 import cvxpy.settings as cps
 from cvxpy.reductions.solvers.defines import INSTALLED_SOLVERS
 from cvxpy.reductions.solvers.solving_chain import SolvingChain
+import cvxpy.lin_ops.lin_op as lo
+import scipy.sparse as spa
+from time import time
 # Progress bars
 from tqdm.auto import tqdm
 
 
+def _populate_and_solve(theta, vectors, need_strategy, problem):
+    """Populate and solve the problem in a worker process."""
+    return problem.populate_and_solve(theta, vectors, need_strategy)
+
+
 class Problem(object):
 
     def __init__(self,
@@ -57,6 +68,12 @@ class Problem(object):
 
         self._x = None   # Raw solution
 
+        # Parameter to vectors mapping and data template
+        # (only if parameters appear in vectors)
+        self._param_map = None
+        self._param_map_valid = None
+        self._data_template = None
+
         # Add default solver options to solver options
         if solver == stg.DEFAULT_SOLVER:
             solver_options.update(stg.DEFAULT_SOLVER_OPTIONS)
@@ -81,6 +98,24 @@ class Problem(object):
         self._cache = self.cvxpy_problem._cache
         self._data = data
 
+        # Workers hold the previous problem data
+        self.close_pool()
+
+        # Solving chain with the KKT solver to solve with strategies.
+        # Built once and pickled with the problem to parallel workers.
+        self._kkt_chain = None
+        self._kkt_chain = self.kkt_solving_chain
+
+    @property
+    def kkt_solving_chain(self):
+        """Solving chain replacing the solver with the KKT solver."""
+        if getattr(self, '_kkt_chain', None) is None:
+            reductions = self._cache.solving_chain.reductions
+            self._kkt_chain = \
+                SolvingChain(problem=self.cvxpy_problem,
+                             reductions=reductions[:-1] + [KKTSolver()])
+        return self._kkt_chain
+
     def sense(self):
         return type(self.cvxpy_problem.objective)
 
@@ -95,6 +130,7 @@ class Problem(object):
         if s not in INSTALLED_SOLVERS:
             e.value_error('Solver %s not installed.' % s)
         self._solver = s
+        self.close_pool()  # Workers hold the previous solver
 
     @property
     def n_var(self):
@@ -228,13 +264,18 @@ class Problem(object):
         A, b = data[cps.A], data[cps.B]
         F, g = data[cps.F], data[cps.G]
 
+        # Solutions can be stacked by column with either the same
+        # vectors b and g or one column of b and g each
+        if np.ndim(x) == 2 and np.ndim(b) == 1:
+            b, g = b[:, None], g[:, None]
+
         eq_viol, ineq_viol = 0, 0
         if A.size:
-            eq_viol = np.linalg.norm(A.dot(x) - b, np.inf)
-            eq_viol /= 1 + np.linalg.norm(b, np.inf)
+            eq_viol = np.max(np.abs(A.dot(x) - b), axis=0)
+            eq_viol /= 1 + np.max(np.abs(b), axis=0)
         if F.size:
-            ineq_viol = np.linalg.norm(np.maximum(F.dot(x) - g, 0), np.inf)
-            ineq_viol /= 1 + np.linalg.norm(g, np.inf)
+            ineq_viol = np.max(np.maximum(F.dot(x) - g, 0), axis=0)
+            ineq_viol /= 1 + np.max(np.abs(g), axis=0)
 
         return np.maximum(eq_viol, ineq_viol)
 
@@ -254,14 +295,264 @@ class Problem(object):
 
         return data, inverse_data, solving_chain
 
+    def parameter_vectors(self, theta):
+        """
+        Stack parameter vectors for each point in theta. The columns are
+        ordered as in the CVXPY parametric program, including the
+        constant offset column.
+
+        Parameters
+        ----------
+        theta : DataFrame
+            Parameter values.
+
+        Returns
+        -------
+        numpy array
+            Parameter vectors of dimension
+            :code:`n_points x (n_parameters + 1)`.
+        """
+        if isinstance(theta, pd.Series):
+            theta = pd.DataFrame(theta).transpose()
+        param_prog = self._cache.param_prog
+        n_points = len(theta)
+
+        Theta = np.zeros((n_points, param_prog.total_param_size + 1))
+        for p in self.parameters:
+            col = param_prog.param_id_to_col[p.id]
+            values = np.array(theta[p.name()].values.tolist(),
+                              dtype=float).reshape((n_points,) + p.shape)
+            # Flatten each value in Fortran order as CVXPY
+            values = np.transpose(values, [0] + list(range(p.ndim, 0, -1)))
+            Theta[:, col:col + p.size] = values.reshape(n_points, p.size)
+        Theta[:, param_prog.param_id_to_col[lo.CONSTANT_ID]] = 1.
+
+        return Theta
+
+    @property
+    def parameter_map(self):
+        """
+        Sparse linear map from the parameter vector to the stacked
+        problem vectors :code:`(q, offset, b, g)`.
+
+        Parameters must appear only in the vectors.
+        """
+        if self.parameters_in_matrices:
+            e.value_error("Parameters appear in the problem matrices. "
+                          "Problem vectors are not an affine function "
+                          "of the parameters.")
+
+        if getattr(self, '_param_map', None) is None:
+            param_prog = self._cache.param_prog
+            n_con = param_prog.constr_size
+
+            # Rows of [A | b] corresponding to the offset column
+            # The QP data is b = -bg and g = -bg.
+            M_A = param_prog.A.tocsr()
+            bg_map = -M_A[M_A.shape[0] - n_con:]
+
+            self._param_map = spa.vstack([param_prog.q.tocsr(), bg_map],
+                                         format='csr')
+
+        return self._param_map
+
+    @property
+    def parameter_map_valid(self):
+        """
+        Check if :attr:`parameter_map` gives the problem vectors computed
+        by CVXPY. The map relies on the layout of the CVXPY parametric
+        program and it is checked once with the current parameter values.
+        If the values are not set, it is checked with the first point
+        passed to :meth:`problem_data_batch`.
+        """
+        if self.parameters_in_matrices:
+            return False
+        if getattr(self, '_param_map_valid', None) is None and \
+                all(p.value is not None for p in self.parameters):
+            self._check_parameter_map()
+        return getattr(self, '_param_map_valid', None) is not False
+
+    def _check_parameter_map(self, theta=None):
+        """Compare the problem vectors from :attr:`parameter_map` with the
+        ones computed by CVXPY for the parameter vector theta (defaults to
+        the current parameter values)."""
+        values = {p.id: p.value for p in self.parameters}
+        if theta is None:
+            theta = self.parameter_vectors(pd.Series(
+                {p.name(): p.value for p in self.parameters}))[0]
+        else:
+            param_prog = self._cache.param_prog
+            for p in self.parameters:
+                col = param_prog.param_id_to_col[p.id]
+                p.value = theta[col:col + p.size].reshape(p.shape,
+                                                          order='F')
+
+        data, inverse_data, _ = self._get_problem_data()
+        for p in self.parameters:
+            p.value = values[p.id]
+
+        vectors = self._split_vectors(self.parameter_map @ theta)
+        self._param_map_valid = \
+            all(np.allclose(vectors[k], data[k]) for k in
+                [cps.Q, cps.B, cps.G]) and \
+            np.allclose(vectors[cps.OFFSET], inverse_data[-1][cps.OFFSET])
+        if not self._param_map_valid:
+            e.warning("Problem vectors from the parameter map do not "
+                      "match the ones computed by CVXPY. Using the CVXPY "
+                      "parametric program for each point.")
+
+    def problem_data_batch(self, theta):
+        """
+        Compute problem vectors for all the points in theta with a single
+        sparse matrix product. Parameters must appear only in the vectors.
+
+        Parameters
+        ----------
+        theta : DataFrame or numpy array
+            Parameter values or parameter vectors from
+            :meth:`parameter_vectors`.
+
+        Returns
+        -------
+        dict
+            Stacked vectors :code:`q`, :code:`b`, :code:`g` with one
+            row per point and the objective :code:`offset`.
+        """
+        if not isinstance(theta, np.ndarray):
+            theta = self.parameter_vectors(theta)
+
+        if getattr(self, '_param_map_valid', None) is None and \
+                not self.parameters_in_matrices and len(theta):
+            self._check_parameter_map(theta[0])
+        if not self.parameter_map_valid:
+            e.value_error("Problem vectors are not available from "
+                          "the parameter map.")
+
+        vectors = self._split_vectors(self.parameter_map @ theta.T)
+
+        return {k: v.T for k, v in vectors.items()}
+
+    @property
+    def vector_maps(self):
+        """
+        Dense linear maps from the parameter vector to the problem
+        vectors :code:`q`, :code:`b`, :code:`g` and the objective
+        :code:`offset`. Parameters must appear only in the vectors.
+        """
+        if not self.parameter_map_valid:
+            e.value_error("Problem vectors are not available from "
+                          "the parameter map.")
+        vector_maps = self._split_vectors(self.parameter_map.toarray())
+        vector_maps[cps.OFFSET] = vector_maps[cps.OFFSET].flatten()
+        return vector_maps
+
+    def _split_vectors(self, vectors):
+        """Split rows of stacked problem vectors :code:`(q, offset, b, g)`
+        as in :attr:`parameter_map`."""
+        n_var, n_eq = self.n_var, self._data['n_eq']
+
+        return {cps.Q: vectors[:n_var],
+                cps.OFFSET: vectors[n_var],
+                cps.B: vectors[n_var + 1:n_var + 1 + n_eq],
+                cps.G: vectors[n_var + 1 + n_eq:]}
+
+    @property
+    def offset_column(self):
+        """Index of the constant offset in the parameter vector."""
+        return self._cache.param_prog.param_id_to_col[lo.CONSTANT_ID]
+
+    def affine_policy(self, strategy, factors, sparse=False):
+        """
+        Explicit affine policy of the solution with a fixed strategy.
+
+        With parameters only in the vectors, the solution of the KKT
+        system is a linear function of the parameter vector
+        :code:`theta` from :meth:`parameter_vectors`
+
+        .. code::
+
+            x = G_x @ theta,    y = G_y @ theta,
+            cost = theta @ H @ theta
+
+        where :code:`cost` is the objective value.
+
+        Args:
+            strategy (Strategy): Strategy to apply.
+            factors (function): KKT matrix factorization solving
+                the KKT system.
+            sparse (bool): Store :code:`G_x` and :code:`G_y` as sparse
+                matrices. Defaults to False.
+
+        Returns: Dictionary with :code:`x`, :code:`y` and :code:`cost`
+            matrices.
+
+        """
+        maps = self.vector_maps
+        Q, B, G, d = maps[cps.Q], maps[cps.B], maps[cps.G], maps[cps.OFFSET]
+        data = self._data
+        off = self.offset_column
+
+        # KKT right-hand side as a function of theta. Constant terms
+        # from the strategy (integer variables) go in the offset column.
+        rhs_map = strategy.kkt_rhs(data, Q, B, G)
+        rhs_const = strategy.kkt_rhs(data, np.zeros(len(Q)),
+                                     np.zeros(len(B)), np.zeros(len(G)))
+        rhs_map -= rhs_const[:, None]
+        rhs_map[:, off] += rhs_const
+
+        # Solve for each column
+        sol_map = np.column_stack([factors(rhs_map[:, j])
+                                   for j in range(rhs_map.shape[1])])
+        G_x, G_y = strategy.kkt_solution(data, sol_map)
+        if strategy.eliminates_int_vars(data):
+            # Fixed integer variables are constant terms
+            int_idx = data[cps.INT_IDX]
+            G_x[int_idx] = 0.
+            G_x[int_idx, off] = strategy.int_vars
+
+        # Cost: 1/2 x' P x + q' x + d as a quadratic form in theta
+        H = .5 * G_x.T @ (self._data[cps.P] @ G_x)
+        H += .5 * (Q.T @ G_x + G_x.T @ Q)
+        H[off, :] += .5 * d
+        H[:, off] += .5 * d
+        if self.sense() == cp.Maximize:
+            H = -H
+
+        if sparse:
+            G_x, G_y = spa.csr_matrix(G_x), spa.csr_matrix(G_y)
+
+        return {'x': G_x, 'y': G_y, 'cost': H}
+
+    def _get_problem_data_from_vectors(self, q, b, g, offset):
+        """Problem data from the vectors in :meth:`problem_data_batch`
+        without applying the CVXPY parametric program.
+        Parameters must appear only in the vectors.
+
+        The fixed matrices are taken from a template computed once
+        with the current parameter values.
+        """
+        if getattr(self, '_data_template', None) is None:
+            self._data_template = self._get_problem_data()
+        data, inverse_data, solving_chain = self._data_template
+
+        data = data.copy()
+        data[cps.Q], data[cps.B], data[cps.G] = q, b, g
+        solver_inverse_data = inverse_data[-1].copy()
+        solver_inverse_data[cps.OFFSET] = offset
+        inverse_data = inverse_data[:-1] + [solver_inverse_data]
+
+        return data, inverse_data, solving_chain
+
     def solve(self, problem_data=None, solver_data=None,
-              strategy=None, cache=None):
+              strategy=None, cache=None, need_strategy=True):
         """Solve optimization problem.
 
         Kwargs:
             solver (string): Solver to use. Defaults to
             strategy (Strategy): Strategy to apply. Default none.
             cache (dict): KKT solver cache
+            need_strategy (bool): Compute the strategy of the solution.
+                If False, the results have no 'strategy'. Default True.
 
         Returns: Dictionary of results
 
@@ -277,11 +568,10 @@ class Problem(object):
                 e.value_error("Strategy incompatible for current problem")
 
         if strategy is not None:
-            strategy.apply(data, inverse_data[-1])
-            solving_chain = \
-                SolvingChain(problem=self.cvxpy_problem,
-                             reductions=solving_chain.reductions[:-1] +
-                             [KKTSolver()])
+            # A_red is needed only without the factorized KKT matrix
+            strategy.apply(data, inverse_data[-1],
+                           reduce_A=cache is None or 'factors' not in cache)
+            solving_chain = self.kkt_solving_chain
             solver_options = {}
         else:
             solver_options = self.solver_options
@@ -294,10 +584,133 @@ class Problem(object):
         )
 
         return self._parse_solution(raw_solution, data, self.cvxpy_problem,
-                                    solving_chain, inverse_data)
+                                    solving_chain, inverse_data,
+                                    need_strategy=need_strategy)
+
+    def evaluate_strategies(self, problem_data, strategies, caches,
+                            early_exit=False):
+        """Evaluate candidate strategies with their cached KKT factors
+        without unpacking the solutions into the CVXPY problem.
+
+        Args:
+            problem_data (tuple): Problem data, inverse data and chain.
+            strategies (list): Candidate strategies.
+            caches (list): KKT solver caches of the strategies. Symbolic
+                caches are refactorized with the current matrices.
+            early_exit (bool): Stop at the first candidate that is
+                certified optimal, see :meth:`certify_strategy`.
+
+        Returns: Dictionary with the stacked primal solutions 'x'
+                 (one column per evaluated candidate), the list of KKT
+                 dual solutions 'y', the arrays of 'cost' and
+                 'infeasibility' of the candidates, and 'certified'
+                 which is True if the last candidate is certified
+                 optimal. Singular candidates have infinite cost and
+                 infeasibility.
+
+        """
+        data, inverse_data, _ = problem_data
+        q, b, g = data[cps.Q], data[cps.B], data[cps.G]
+        n_var = len(q)
+        early_exit = early_exit and not self.is_mip()
+
+        # Solve linear systems with the cached factors
+        t_start = time()
+        n_cand = len(strategies)
+        x = np.empty((n_var, n_cand))
+        y = []
+        certified = False
+        with CatchSingularMatrixWarnings():
+            for j in range(n_cand):
+                factors = caches[j].get('factors')
+                if factors is None:
+                    strategies[j].apply(data, inverse_data[-1])
+                    factors = caches[j]['symbolic'].refactorize(
+                        create_kkt_matrix(data))
+                sol = factors(strategies[j].kkt_rhs(data, q, b, g))
+                x[:, j], y_j = strategies[j].kkt_solution(data, sol)
+                y.append(y_j)
+                if early_exit and \
+                        self.certify_strategy(strategies[j], x[:, j],
+                                              y[j], data):
+                    x = x[:, :j + 1]
+                    certified = True
+                    break
+        t_solve = time() - t_start
+
+        # Cost and infeasibility of all the candidates
+        cost = .5 * np.sum(x * (data[cps.P] @ x), axis=0) + q @ x
+        cost += inverse_data[-1][cps.OFFSET]
+        if self.sense() == cp.Maximize:
+            cost = -cost
+        infeas = self.infeasibility(x, data)
+        singular = np.any(np.isnan(x), axis=0)
+        cost[singular], infeas[singular] = np.inf, np.inf
+
+        return {'x': x, 'y': y, 'cost': cost, 'infeasibility': infeas,
+                'certified': certified, 'time': t_solve}
+
+    def certify_strategy(self, strategy, x, y, data):
+        """Check if the KKT solution of a strategy is optimal.
+
+        For continuous problems, the solution is optimal if it is
+        primal feasible and the multipliers of the tight constraints
+        are nonnegative.
+
+        Args:
+            strategy (Strategy): Strategy applied.
+            x (numpy array): Primal KKT solution.
+            y (numpy array): Dual KKT solution.
+            data (dict): Problem data.
+
+        Returns: True if the solution is optimal.
+
+        """
+        if np.any(np.isnan(x)) or \
+                self.infeasibility(x, data) > stg.INFEAS_TOL:
+            return False
+        n_eq = data[cps.A].shape[0]
+        n_tight = np.sum(strategy.tight_constraints)
+        y_tight = y[n_eq:n_eq + n_tight]
+
+        return not np.any(y_tight < -stg.DUAL_INFEAS_TOL)
+
+    def unpack_strategy_solution(self, problem_data, strategy, x, y,
+                                 solve_time):
+        """Unpack the KKT solution of a strategy into the CVXPY problem.
+
+        Args:
+            problem_data (tuple): Problem data, inverse data and chain.
+            strategy (Strategy): Strategy applied.
+            x (numpy array): Primal KKT solution.
+            y (numpy array): Dual KKT solution.
+            solve_time (float): Time to report.
+
+        Returns: Dictionary of results as in :meth:`solve` with
+                 the strategy applied.
+
+        """
+        data, inverse_data, _ = problem_data
+        strategy.store_inverse_data(data, inverse_data[-1])
+        solving_chain = self.kkt_solving_chain
+
+        raw_solution = {'x': x, 'y': y, 'time': solve_time}
+        if np.any(np.isnan(x)):
+            raw_solution['status'] = cps.INFEASIBLE
+        else:
+            raw_solution['status'] = cps.OPTIMAL
+            raw_solution['cost'] = .5 * x.dot(data[cps.P].dot(x)) + \
+                data[cps.Q].dot(x)
+
+        results = self._parse_solution(raw_solution, data,
+                                       self.cvxpy_problem, solving_chain,
+                                       inverse_data, need_strategy=False)
+        results['strategy'] = strategy
+
+        return results
 
     def _parse_solution(self, raw_solution, data, problem,
-                        solving_chain, inverse_data):
+                        solving_chain, inverse_data, need_strategy=True):
         """TODO: Docstring for _parse_solution.
 
         Args:
@@ -306,6 +719,7 @@ class Problem(object):
             problem (TODO): TODO
             solving_chain (TODO): TODO
             inverse_data (TODO): TODO
+            need_strategy (bool): Compute the strategy of the solution.
 
         Returns: TODO
 
@@ -331,21 +745,64 @@ class Problem(object):
             results['x'] = x
             results['cost'] = self.cvxpy_problem.objective.value
             results['infeasibility'] = self.infeasibility(x, data)
-            results['strategy'] = Strategy(x, data)
+            if need_strategy:
+                results['strategy'] = Strategy(x, data)
         else:
             results['x'] = np.nan * np.ones(self.n_var)
             results['cost'] = np.inf
             results['infeasibility'] = np.inf
-            results['strategy'] = None
+            if need_strategy:
+                results['strategy'] = None
 
         return results
 
-    def populate_and_solve(self, theta):
+    def worker_pool(self, n_jobs):
+        """
+        Persistent pool of n_jobs worker processes holding a copy of
+        the problem. It is created on first use and kept for the next
+        calls with the same number of processes. It is closed when the
+        solver or the problem canonicalization change.
+
+        Parameters
+        ----------
+        n_jobs : int
+            Number of worker processes.
+
+        Returns
+        -------
+        ProblemPool
+            Worker pool.
+        """
+        pool = getattr(self, '_pool', None)
+        if pool is None or pool.n_jobs != n_jobs or pool.broken:
+            self.close_pool()
+            self._pool = ProblemPool(self, n_jobs)
+        return self._pool
+
+    def close_pool(self):
+        """Terminate the worker pool processes if any."""
+        if getattr(self, '_pool', None) is not None:
+            self._pool.shutdown()
+        self._pool = None
+
+    def __getstate__(self):
+        """Do not pickle the worker pool."""
+        state = self.__dict__.copy()
+        state.pop('_pool', None)
+        return state
+
+    def populate_and_solve(self, theta, vectors=None, need_strategy=True):
         """Single function to populate the problem with
            theta and solve it with the solver.
-           Useful for multiprocessing."""
+           Useful for multiprocessing.
+
+           If the problem vectors :code:`(q, b, g, offset)` are passed,
+           they are used instead of applying the parametric program."""
         self.populate(theta)
-        results = self.solve()
+        problem_data = None
+        if vectors is not None:
+            problem_data = self._get_problem_data_from_vectors(*vectors)
+        results = self.solve(problem_data, need_strategy=need_strategy)
 
         return results
 
@@ -353,6 +810,8 @@ class Problem(object):
                          batch_size=stg.JOBLIB_BATCH_SIZE,
                          parallel=True,  # Solve problems in parallel
                          message="Solving for all theta",
+                         result_batch=False,
+                         need_strategy=True,
                          ):
         """
         Solve parametric problems for each value of theta.
@@ -365,11 +824,16 @@ class Problem(object):
             Solve problems in parallel. Default True.
         message : str, optional
             Message to be printed on progress bar.
+        result_batch : bool, optional
+            Return results stored as arrays in a :class:`ResultBatch`.
+            Default False.
+        need_strategy : bool, optional
+            Compute the strategy of each solution. Default True.
 
         Returns
         -------
-        dict
-            Results dictionary.
+        list or ResultBatch
+            Results dictionaries.
         """
         n = len(theta)  # Number of points
 
@@ -377,9 +841,31 @@ class Problem(object):
 
         stg.logger.info(message + " (n_jobs = %d)" % n_jobs)
 
-        results = Parallel(n_jobs=n_jobs, batch_size=batch_size)(
-            delayed(self.populate_and_solve)(theta.iloc[i])
-            for i in tqdm(range(n))
-        )
+        vectors = [None] * n
+        if not self.parameters_in_matrices and n > 0:
+            self.populate(theta.iloc[0])
+            if self.parameter_map_valid:
+                # Compute all problem vectors at once
+                if getattr(self, '_data_template', None) is None:
+                    self._data_template = self._get_problem_data()
+                batch = self.problem_data_batch(theta)
+                vectors = [(batch[cps.Q][i], batch[cps.B][i],
+                            batch[cps.G][i], batch[cps.OFFSET][i])
+                           for i in range(n)]
+
+        if n_jobs == 1:
+            results = [self.populate_and_solve(theta.iloc[i], vectors[i],
+                                               need_strategy)
+                       for i in tqdm(range(n))]
+        else:
+            results = self.worker_pool(n_jobs).map(
+                _populate_and_solve,
+                [(theta.iloc[i], vectors[i], need_strategy)
+                 for i in range(n)],
+                solver_options=self.solver_options,
+                chunk_size=batch_size)
+
+        if result_batch:
+            return ResultBatch.from_results(results, n_var=self.n_var)
 
         return results
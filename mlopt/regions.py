@@ -0,0 +1,163 @@
+import numpy as np
+from mlopt import settings as stg
+from mlopt import error as e
+import cvxpy.settings as cps
+import scipy.sparse as spa
+
+
+class CriticalRegions(object):
+    """
+    Critical regions index for exact strategy lookup.
+
+    With parameters only in the vectors and no integer variables, each
+    strategy is optimal over a polyhedral region of the parameter
+    vector :code:`theta` defined by
+
+    - primal feasibility of the inactive constraints
+      :code:`F_inactive x(theta) <= g_inactive(theta)`
+    - dual feasibility of the tight constraints
+      :code:`y_tight(theta) >= 0`
+
+    where :code:`x(theta)` and :code:`y(theta)` are the affine policies of
+    the strategy. Each region is stored as a matrix :code:`H` such that
+    the region is :code:`H @ theta <= 0`.
+
+    Regions are indexed by bounding boxes over the parameters covering
+    the training points of each strategy. Point location checks the
+    region inequalities only for the regions whose box contains the point.
+
+    Parameters
+    ----------
+    primal : list
+        Primal feasibility inequalities for each region.
+    dual : list
+        Dual feasibility inequalities for each region.
+    g_map : numpy array
+        Map from the parameter vector to the inequality constraints vector
+        to scale the primal infeasibility.
+    lower : numpy array
+        Lower corner of the bounding box of each region.
+    upper : numpy array
+        Upper corner of the bounding box of each region.
+    order : numpy array
+        Order to check the regions (most frequent first).
+    """
+
+    def __init__(self, primal, dual, g_map, lower, upper, order):
+        self.primal = primal
+        self.dual = dual
+        self.g_map = g_map
+        self.lower = lower
+        self.upper = upper
+        self.order = order
+
+    @classmethod
+    def from_policies(cls, problem, encoding, solver_cache,
+                      theta, labels, margin=0.1):
+        """
+        Build critical regions from the affine policies.
+
+        Parameters
+        ----------
+        problem : Problem
+            Optimization problem.
+        encoding : StrategyTable
+            Strategies.
+        solver_cache : list
+            Solver cache for each strategy containing the affine policy.
+        theta : numpy array
+            Training parameter vectors.
+        labels : numpy array
+            Training strategy labels.
+        margin : float, optional
+            Relative margin to enlarge the bounding boxes. Defaults to 0.1.
+
+        Returns
+        -------
+        CriticalRegions
+            Critical regions index.
+        """
+        if problem.is_mip():
+            e.value_error("Critical regions are defined only for "
+                          "continuous problems.")
+
+        F = problem._data[cps.F]
+        n_eq = problem._data['n_eq']
+        g_map = problem.vector_maps[cps.G]
+        n_strategies = len(encoding)
+
+        primal, dual = [], []
+        for label in range(n_strategies):
+            tight = encoding[label].tight_constraints
+            policy = solver_cache[label]['policy']
+            G_x, G_y = policy['x'], policy['y']
+            if spa.issparse(G_x):
+                G_x, G_y = G_x.toarray(), G_y.toarray()
+
+            # Inactive constraints: F x(theta) - g(theta) <= 0
+            primal.append(F[~tight] @ G_x - g_map[~tight])
+
+            # Tight constraints multipliers: -y(theta) <= 0
+            n_tight = np.sum(tight)
+            dual.append(-G_y[n_eq:n_eq + n_tight])
+
+        # Bounding boxes from the training points
+        n_theta = theta.shape[1]
+        lower = np.full((n_strategies, n_theta), np.inf)
+        upper = np.full((n_strategies, n_theta), -np.inf)
+        for label in range(n_strategies):
+            theta_label = theta[labels == label]
+            if len(theta_label):
+                lower[label] = np.min(theta_label, axis=0)
+                upper[label] = np.max(theta_label, axis=0)
+        width = margin * np.maximum(upper - lower, 0) + stg.INFEAS_TOL
+        lower -= width
+        upper += width
+
+        # Check most frequent regions first
+        order = np.argsort(np.bincount(labels, minlength=n_strategies))[::-1]
+
+        return cls(primal, dual, g_map, lower, upper, order)
+
+    def __len__(self):
+        return len(self.primal)
+
+    def contains(self, label, theta):
+        """Check if the region of strategy label contains theta."""
+        g_norm = np.linalg.norm(self.g_map @ theta, np.inf)
+        primal = self.primal[label] @ theta
+        if len(primal) and np.max(primal) > \
+                stg.INFEAS_TOL * (1 + g_norm):
+            return False
+        dual = self.dual[label] @ theta
+        if len(dual) and np.max(dual) > stg.DUAL_INFEAS_TOL:
+            return False
+        return True
+
+    def locate(self, theta):
+        """
+        Find the strategy optimal at each parameter vector.
+
+        Parameters
+        ----------
+        theta : numpy array
+            Parameter vectors with one row per point.
+
+        Returns
+        -------
+        numpy array
+            Strategy label for each point. -1 if no region
+            contains the point.
+        """
+        theta = np.atleast_2d(theta)
+        lower, upper = self.lower[self.order], self.upper[self.order]
+        located = np.full(len(theta), -1, dtype=int)
+        for i in range(len(theta)):
+            in_box = np.all((lower <= theta[i]) & (theta[i] <= upper),
+                            axis=1)
+            for label in self.order[in_box]:
+                if self.contains(label, theta[i]):
+                    located[i] = label
+                    break
+
+        return located
@@ -0,0 +1,125 @@
+import numpy as np
+import cvxpy.settings as cps
+from mlopt.strategy import encode_strategies
+
+
+class ResultBatch(object):
+    """
+    Results of many points stored as arrays with one row per point.
+
+    Strategies are stored as labels referring to a table of unique
+    strategies. Indexing with an integer returns the result dictionary
+    of the point as returned by :meth:`Problem.solve`.
+
+    Parameters
+    ----------
+    x : numpy array
+        Solutions, one row per point.
+    cost : numpy array
+        Objective values.
+    infeasibility : numpy array
+        Infeasibility of the solutions.
+    time : numpy array
+        Solution times.
+    status : numpy array, optional
+        Solver status. Defaults to optimal for the points with a solution
+        and infeasible for the others.
+    labels : numpy array, optional
+        Strategy label of each point in strategies. -1 if there is no
+        strategy.
+    strategies : StrategyTable, optional
+        Strategies referred by the labels.
+    pred_time : numpy array, optional
+        Prediction times.
+    solve_time : numpy array, optional
+        Solution times without the prediction times.
+    """
+
+    def __init__(self, x, cost, infeasibility, time, status=None,
+                 labels=None, strategies=None,
+                 pred_time=None, solve_time=None):
+        self.x = x
+        self.cost = cost
+        self.infeasibility = infeasibility
+        self.time = time
+        if status is None:
+            status = np.where(np.any(np.isnan(x), axis=1),
+                              cps.INFEASIBLE, cps.OPTIMAL).astype(object)
+        self.status = status
+        self.labels = labels
+        self.strategies = strategies
+        self.pred_time = pred_time
+        self.solve_time = solve_time
+
+    @classmethod
+    def from_results(cls, results, n_var=0):
+        """
+        Create batch from a list of result dictionaries.
+
+        Parameters
+        ----------
+        results : list
+            Result dictionaries.
+        n_var : int, optional
+            Number of variables to shape the solutions of an empty list
+            of results. Defaults to 0.
+
+        Returns
+        -------
+        ResultBatch
+            Results stored as arrays.
+        """
+        if not results:
+            return cls(np.empty((0, n_var)), np.empty(0), np.empty(0),
+                       np.empty(0), labels=np.empty(0, dtype=int))
+
+        def stack(key):
+            if all(key in r for r in results):
+                return np.array([r[key] for r in results])
+            return None
+
+        # Encode unique strategies
+        labels = np.full(len(results), -1, dtype=int)
+        idx_strategy = [i for i, r in enumerate(results)
+                        if r.get('strategy') is not None]
+        strategies = None
+        if idx_strategy:
+            labels[idx_strategy], strategies = encode_strategies(
+                [results[i]['strategy'] for i in idx_strategy])
+
+        return cls(np.array([r['x'] for r in results]),
+                   stack('cost'), stack('infeasibility'), stack('time'),
+                   status=stack('status'),
+                   labels=labels, strategies=strategies,
+                   pred_time=stack('pred_time'),
+                   solve_time=stack('solve_time'))
+
+    def __len__(self):
+        return len(self.x)
+
+    def __getitem__(self, i):
+        result = {'x': self.x[i],
+                  'cost': self.cost[i],
+                  'infeasibility': self.infeasibility[i],
+                  'time': self.time[i],
+                  'status': self.status[i],
+                  'strategy': self.strategy(i)}
+        if self.pred_time is not None:
+            result['pred_time'] = self.pred_time[i]
+        if self.solve_time is not None:
+            result['solve_time'] = self.solve_time[i]
+        return result
+
+    def __iter__(self):
+        for i in range(len(self)):
+            yield self[i]
+
+    def strategy(self, i):
+        """Strategy of point i. None if there is no strategy."""
+        if self.labels is None or self.labels[i] < 0:
+            return None
+        return self.strategies[int(self.labels[i])]
+
+    def to_list(self):
+        """List of result dictionaries."""
+        return list(self)
@@ -1,15 +1,9 @@
-from joblib import Parallel, delayed
 import numpy as np
 from scipy.special import gammainc
 import pandas as pd
-from mlopt.strategy import encode_strategies
+from mlopt.strategy import StrategyEncoder
 from mlopt import settings as stg
 from mlopt import utils as u
-from tqdm import tqdm
-
-
-def count_occurrences(labels, i):
-    return len(np.where(labels == i)[0])
 
 
 class Sampler(object):
@@ -19,6 +13,13 @@ class Sampler(object):
     Parameters
     ----------
 
+    Attributes
+    ----------
+    freq : numpy int array
+        Number of samples for each strategy label.
+    freq_freq : numpy int array
+        Frequencies of frequencies. Element :code:`k` is the number of
+        labels appearing :code:`k` times.
     """
 
     def __init__(self,
@@ -37,37 +38,54 @@ class Sampler(object):
         self.alpha = alpha
         self.n_samples = n_samples   # Initialize numer of samples
         self.good_turing_smooth = 1.  # Initialize Good Turing estimator
-    def frequencies(self, labels, batch_size=stg.JOBLIB_BATCH_SIZE, n_jobs=-1):
-        """
-        Get frequency for each unique strategy
-        """
+        self.freq = np.zeros(0, dtype=int)  # Frequency of each label
+        self.freq_freq = np.zeros(1, dtype=int)  # Frequency of frequencies
 
-        results = Parallel(n_jobs=n_jobs, batch_size=batch_size)(delayed(count_occurrences)(labels, i) for i in tqdm(np.unique(labels)))
-
-        return np.array(results)
+    def update_frequencies(self, labels):
+        """
+        Add labels to the frequency histogram.
 
-    def compute_good_turing(self, labels,
-                            batch_size=stg.JOBLIB_BATCH_SIZE,
-                            parallel=True):
+        The frequencies of frequencies are updated only for the labels
+        appearing in :code:`labels`. Negative labels (points without
+        strategy) are ignored.
+        """
+        labels = np.asarray(labels)
+        counts = np.bincount(labels[labels >= 0], minlength=len(self.freq))
+        touched = np.flatnonzero(counts)
+
+        freq = np.zeros(len(counts), dtype=int)
+        freq[:len(self.freq)] = self.freq
+        freq_old = freq[touched]
+        freq[touched] += counts[touched]
+        freq_new = freq[touched]
+
+        n_bins = max(len(self.freq_freq), np.max(freq_new, initial=0) + 1)
+        freq_freq = np.zeros(n_bins, dtype=int)
+        freq_freq[:len(self.freq_freq)] = self.freq_freq
+        freq_freq -= np.bincount(freq_old[freq_old > 0], minlength=n_bins)
+        freq_freq += np.bincount(freq_new, minlength=n_bins)
+
+        self.freq = freq
+        self.freq_freq = freq_freq
+
+    def compute_good_turing(self, labels):
         """Compute good turing estimator"""
         stg.logger.info("Computing Good Turing Estimator")
 
-        n_jobs = u.get_n_processes() if parallel else 1
+        # Reset frequencies
+        self.freq = np.zeros(0, dtype=int)
+        self.freq_freq = np.zeros(1, dtype=int)
 
-        stg.logger.info("Compute frequencies")
-        # Get frequencies
-        freq = self.frequencies(labels, batch_size, n_jobs=n_jobs)
+        self.update_good_turing(labels)
 
-        # Check if there are labels appearing only once
-        if not any(np.where(freq == 1)[0]):
+    def update_good_turing(self, labels):
+        """Update good turing estimator with new labels"""
+        self.update_frequencies(labels)
+
+        # Number of labels appearing only once
+        n1 = self.freq_freq[1] if len(self.freq_freq) > 1 else 0
+        if n1 == 0:
             stg.logger.info("No labels appearing only once")
-            n1 = 0
-            #  n1 = np.inf
-        else:
-            stg.logger.info("Compute frequencies of frequencies")
-            # Get frequency of frequencies
-            freq_freq = self.frequencies(freq, batch_size=batch_size, n_jobs=n_jobs)
-            n1 = freq_freq[0]
 
         # Get Good Turing estimator
         self.good_turing = n1/self.n_samples
@@ -83,10 +101,13 @@ class Sampler(object):
 
         stg.logger.info("Iterative sampling")
 
-        # Initialize dataframes
-        theta = pd.DataFrame()
-        s_theta = []
-        obj_theta = []
+        # Initialize buffers
+        theta = u.DataFrameBuffer()
+        labels = u.GrowingArray(dtype=int)
+        obj_theta = u.GrowingArray()
+
+        # Encoder keeping labels and frequencies across iterations
+        encoder = StrategyEncoder()
 
         # Start with 100 samples
         for self.niter in range(self.max_iter):
@@ -95,17 +116,16 @@ class Sampler(object):
             results = self.problem.solve_parametric(theta_new,
                                                     parallel=parallel)
             s_theta_new = [r['strategy'] for r in results]
-            obj_theta_new = [r['cost'] for r in results]
-            theta = theta.append(theta_new, ignore_index=True)
-            s_theta += s_theta_new
-            obj_theta += obj_theta_new
+            theta.append(theta_new)
+            obj_theta.append([r['cost'] for r in results])
             self.n_samples += self.n_samples_iter
 
-            # Get unique strategies
-            labels, encoding = encode_strategies(s_theta)
+            # Encode only the new strategies
+            labels_new = encoder.encode(s_theta_new)
+            labels.append(labels_new)
 
             # Get Good Turing Estimator
-            self.compute_good_turing(labels)
+            self.update_good_turing(labels_new)
 
             stg.logger.info("i: %d, gt: %.2e, gt smooth: %.2e, n: %d " %
                          (self.niter+1, self.good_turing,
@@ -115,7 +135,7 @@ class Sampler(object):
             if (self.good_turing_smooth < epsilon):
 
                 # Compute number of strategies
-                n_strategies = len(encoding)
+                n_strategies = len(encoder)
 
                 # Compute ideal number of strategies
                 n_samples_ideal = self.n_samples_strategy * n_strategies
@@ -127,17 +147,16 @@ class Sampler(object):
                     theta_new = self.sampling_fn(n_samples_todo)
                     results = self.problem.solve_parametric(theta_new, parallel=parallel)
                     s_theta_new = [r['strategy'] for r in results]
-                    obj_theta_new = [r['cost'] for r in results]
-                    theta = theta.append(theta_new, ignore_index=True)
-                    s_theta += s_theta_new
-                    obj_theta += obj_theta_new
+                    theta.append(theta_new)
+                    obj_theta.append([r['cost'] for r in results])
                     self.n_samples += n_samples_todo
 
-                    # Get unique strategies
-                    labels, encoding = encode_strategies(s_theta)
+                    # Encode only the new strategies
+                    labels_new = encoder.encode(s_theta_new)
+                    labels.append(labels_new)
 
                     # Get Good Turing Estimator
-                    self.compute_good_turing(labels)
+                    self.update_good_turing(labels_new)
 
                 break
 
@@ -149,7 +168,8 @@ class Sampler(object):
             #  if bound < epsilon:
             #      break
 
-        return theta, labels, obj_theta, encoding
+        return theta.to_dataframe(), labels.array, obj_theta.array, \
+            encoder.encoding
 
 
 def sample_around_points(df,
@@ -162,7 +182,7 @@ def sample_around_points(df,
     """
     n_samples_per_point = np.round(n_total / len(df), decimals=0).astype(int)
 
-    df_samples = pd.DataFrame()
+    df_samples = []
 
     for idx, row in df.iterrows():
         df_row = pd.DataFrame()
@@ -183,9 +203,9 @@ def sample_around_points(df,
 
             df_row[col] = samples
 
-        df_samples = df_samples.append(df_row)
+        df_samples.append(df_row)
 
-    return df_samples
+    return pd.concat(df_samples)
 
 
 def uniform_sphere_sample(center, radius, n=1):
@@ -25,10 +25,35 @@ JOBLIB_BATCH_SIZE = 100
 
 # Define constants
 INFEAS_TOL = 1e-04
+DUAL_INFEAS_TOL = 1e-04
 SUBOPT_TOL = 1e-04
 TIGHT_CONSTRAINTS_TOL = 1e-4
 DIVISION_TOL = 1e-8
 
+# KKT solver
+ELIMINATE_INT_VARS = True  # Substitute fixed integer variables
+
+# KKT linear system solvers
+SUPERLU = "superlu"
+UMFPACK = "umfpack"
+DENSE_LDL = "dense"
+QDLDL = "qdldl"
+DEFAULT_KKT_BACKEND = None  # Choose automatically
+KKT_DENSE_MAX_SIZE = 300  # Dense factorization up to this size
+KKT_DENSE_MIN_DENSITY = 0.3  # or above this density
+KKT_REG = 1e-07  # Regularization of quasi-definite factorizations
+KKT_REGULARIZE = True  # Regularize singular KKT matrices
+KKT_REFINE_ITER = 3  # Iterative refinement steps after regularization
+KKT_RESIDUAL_TOL = 1e-06  # Relative residual of regularized solutions
+KKT_SINGULAR_TOL = 1e-14  # Relative pivot of numerically singular matrices
+KKT_UPDATES = False  # Derive factors from similar strategies
+KKT_UPDATE_MAX_RANK = 10  # Maximum number of changed tight constraints
+KKT_UPDATE_MAX_COND = 1e10  # Maximum Schur complement condition number
+
+# KKT factors cache
+FACTOR_CACHE_MAX_BYTES = None  # Memory budget (None for unlimited)
+FACTOR_CACHE_EVICTION = 'lru'  # Eviction rule ('lru' or 'lfu')
+
 # Define default solver
 DEFAULT_SOLVER = cp.GUROBI
 DEFAULT_SOLVER_OPTIONS = {'Method': 1}  # Dual simplex
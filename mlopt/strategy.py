@@ -1,18 +1,23 @@
-from joblib import Parallel, delayed
 import numpy as np
 from mlopt import settings as stg
 from mlopt import error as e
-from mlopt import utils as u
 import cvxpy.settings as cps
 import scipy.sparse as spa
 from time import time
-from tqdm import tqdm
+import hashlib
 
 
 class Strategy(object):
     """
     Solving strategy.
 
+    The strategy is stored in packed form: the tight constraints are
+    packed into bits with :code:`np.packbits` and the integer variables
+    are rounded to an integer vector. Integer variables farther than
+    :data:`settings.INFEAS_TOL` from an integer raise an error. Hashing
+    uses a digest of the packed bytes and equality compares the packed
+    bytes directly.
+
     Parameters
     ----------
     tight_constraints : numpy bool array
@@ -24,13 +29,231 @@ class Strategy(object):
 
     def __init__(self, x, data):
         """Initialize strategy from problem data."""
-
-        self.tight_constraints = self.get_tight_constraints(x, data)
-        self.int_vars = x[data[cps.INT_IDX]]
+        self._set_packed(np.packbits(self.get_tight_constraints(x, data)),
+                         data[cps.F].shape[0],
+                         x[data[cps.INT_IDX]])
+
+    @classmethod
+    def from_packed(cls, tight_bits, n_tight, int_vars):
+        """Create strategy from packed tight constraints and
+        integer variables without recomputing them from a solution.
+
+        Parameters
+        ----------
+        tight_bits : numpy uint8 array
+            Tight constraints packed with :code:`np.packbits`.
+        n_tight : int
+            Number of inequality constraints.
+        int_vars : numpy array
+            Value of the integer variables.
+
+        Returns
+        -------
+        Strategy
+            Strategy with the packed data.
+        """
+        strategy = cls.__new__(cls)
+        strategy._set_packed(tight_bits, n_tight, int_vars)
+        return strategy
+
+    def _set_packed(self, tight_bits, n_tight, int_vars):
+        """Store packed data, bytes key and digest-based hash."""
+        self._tight_bits = np.asarray(tight_bits, dtype=np.uint8)
+        self._n_tight = int(n_tight)
+        int_vars = np.asarray(int_vars)
+        if not np.issubdtype(int_vars.dtype, np.integer):
+            rounded = np.rint(int_vars)
+            if not np.all(np.abs(int_vars - rounded) <= stg.INFEAS_TOL):
+                e.value_error("Integer variables are not integer within "
+                              "tolerance %.1e" % stg.INFEAS_TOL)
+            if np.any(np.abs(rounded) > np.iinfo(np.int64).max):
+                e.value_error("Integer variables exceed the int64 range")
+            int_vars = rounded
+        self._int_vars = int_vars.astype(np.int64, copy=False)
+
+        # Bytes key for comparisons. The number of inequalities is
+        # included to distinguish the zero padding of the packed bits.
+        self._key = np.int64(self._n_tight).tobytes() + \
+            self._tight_bits.tobytes() + self._int_vars.tobytes()
 
         # Store hash for comparisons
-        self._hash = hash((frozenset(self.tight_constraints),
-                           frozenset(self.int_vars)))
+        self._hash = int.from_bytes(
+            hashlib.blake2b(self._key, digest_size=8).digest(),
+            'little', signed=True)
+
+    @property
+    def tight_constraints(self):
+        """Tight constraints as a numpy bool array."""
+        if getattr(self, '_tight', None) is None:
+            self._tight = np.unpackbits(self._tight_bits,
+                                        count=self._n_tight).astype(bool)
+        return self._tight
+
+    @property
+    def tight_idx(self):
+        """Indices of the tight constraints."""
+        if getattr(self, '_tight_idx', None) is None:
+            self._tight_idx = np.flatnonzero(self.tight_constraints)
+        return self._tight_idx
+
+    def row_selectors(self, data):
+        """Sparse CSR matrices selecting the tight constraints rows of F
+        and the integer variables rows of the identity.
+
+        The selectors are computed once and cached in the strategy.
+
+        Args:
+            data (dict): Problem data.
+
+        Returns: Tuple of selectors of tight constraints and integer
+                 variables.
+
+        """
+        n_var = data[cps.A].shape[1]
+        if getattr(self, '_selectors', None) is None or \
+                self._selectors[0] != n_var:
+            idx = self.tight_idx
+            int_idx = data[cps.INT_IDX]
+            S_tight = spa.csr_matrix((np.ones(len(idx)),
+                                      (np.arange(len(idx)), idx)),
+                                     shape=(len(idx), self._n_tight))
+            S_int = spa.csr_matrix((np.ones(len(int_idx)),
+                                    (np.arange(len(int_idx)), int_idx)),
+                                   shape=(len(int_idx), n_var))
+            self._selectors = (n_var, S_tight, S_int)
+
+        return self._selectors[1:]
+
+    def eliminates_int_vars(self, data):
+        """True if the fixed integer variables are substituted and
+        the KKT system is only over the continuous variables.
+        See :data:`settings.ELIMINATE_INT_VARS`."""
+        return stg.ELIMINATE_INT_VARS and len(data[cps.INT_IDX]) > 0
+
+    def continuous_idx(self, data):
+        """Indices of the continuous variables."""
+        n_var = data[cps.A].shape[1]
+        if getattr(self, '_cont_idx', None) is None or \
+                self._cont_idx[0] != n_var:
+            self._cont_idx = (n_var, np.setdiff1d(np.arange(n_var),
+                                                  data[cps.INT_IDX]))
+        return self._cont_idx[1]
+
+    def kkt_rows(self, data):
+        """Keys of the constraint rows of the reduced KKT system in
+        the order of :code:`A_red`: the equality constraints, the
+        tight constraints (offset by the number of equalities) and,
+        if not eliminated, the integer variables (offset by the number
+        of equalities and inequalities).
+
+        Args:
+            data (dict): Problem data.
+
+        Returns: Sorted integer array.
+
+        """
+        n_eq, n_ineq = data[cps.A].shape[0], data[cps.F].shape[0]
+        rows = [np.arange(n_eq), n_eq + self.tight_idx]
+        if not self.eliminates_int_vars(data):
+            rows.append(n_eq + n_ineq + np.arange(len(data[cps.INT_IDX])))
+        return np.concatenate(rows)
+
+    def int_vars_terms(self, data):
+        """Terms of the fixed integer variables in the linear cost of
+        the continuous variables and in the equality and tight
+        constraints vectors.
+
+        The terms are computed once for the problem matrices in data
+        and cached in the strategy.
+
+        Args:
+            data (dict): Problem data.
+
+        Returns: Tuple of linear cost and constraints terms.
+
+        """
+        matrices = (data[cps.P], data[cps.A], data[cps.F])
+        if getattr(self, '_int_terms', None) is None or \
+                any(M is not N for M, N in zip(self._int_terms[0],
+                                               matrices)):
+            P, A, F = matrices
+            cont, int_idx = self.continuous_idx(data), data[cps.INT_IDX]
+            x_fix = self._int_vars.astype(float)
+            S_tight, _ = self.row_selectors(data)
+            q_fix = P[cont][:, int_idx] @ x_fix
+            b_fix = np.concatenate([A[:, int_idx] @ x_fix,
+                                    S_tight @ (F[:, int_idx] @ x_fix)])
+            self._int_terms = (matrices, q_fix, b_fix)
+
+        return self._int_terms[1:]
+
+    def kkt_rhs(self, data, q, b, g):
+        """Right-hand side of the reduced KKT system.
+
+        With the integer variables eliminated, their fixed values are
+        substituted into the linear cost and the constraints vectors.
+
+        Args:
+            data (dict): Problem data with the matrices.
+            q (numpy array): Linear cost vector.
+            b (numpy array): Equality constraints vector.
+            g (numpy array): Inequality constraints vector.
+
+        The vectors can also be matrices with one column per point.
+
+        Returns: Vector (or matrix) :code:`[-q_red; b_red]`.
+
+        """
+        if not self.eliminates_int_vars(data):
+            return np.concatenate((-q, self.reduce_b(b, g)))
+
+        cont = self.continuous_idx(data)
+        q_fix, b_fix = self.int_vars_terms(data)
+        if np.ndim(q) == 2:
+            q_fix, b_fix = q_fix[:, None], b_fix[:, None]
+
+        return np.concatenate((-(q[cont] + q_fix),
+                               np.concatenate([b, g[self.tight_idx]]) -
+                               b_fix))
+
+    def kkt_solution(self, data, sol):
+        """Full primal and dual solutions from the solution of the
+        reduced KKT system. The vector (or matrix) sol is ordered
+        as :code:`[x; y]` or :code:`[x_continuous; y]` if the integer
+        variables are eliminated.
+
+        Args:
+            data (dict): Problem data.
+            sol (numpy array): KKT system solution.
+
+        Returns: Tuple of primal x and dual y.
+
+        """
+        if not self.eliminates_int_vars(data):
+            n_var = data[cps.A].shape[1]
+            return sol[:n_var], sol[n_var:]
+
+        cont, int_idx = self.continuous_idx(data), data[cps.INT_IDX]
+        x = np.empty((data[cps.A].shape[1],) + sol.shape[1:])
+        x[cont] = sol[:len(cont)]
+        x[int_idx] = self._int_vars[(slice(None),) +
+                                    (None,) * (sol.ndim - 1)]
+
+        return x, sol[len(cont):]
+
+    def __getstate__(self):
+        """Do not pickle the cached unpacked data, selectors and
+        integer variables terms."""
+        state = self.__dict__.copy()
+        for k in ['_tight', '_tight_idx', '_selectors', '_cont_idx',
+                  '_int_terms']:
+            state.pop(k, None)
+        return state
+
+    @property
+    def int_vars(self):
+        """Value of the integer variables."""
+        return self._int_vars
 
     def get_tight_constraints(self, x, data):
         """Compute tight constraints for solution x
@@ -45,7 +268,7 @@ class Strategy(object):
         # Check only inequalities
         F, g = data[cps.F], data[cps.G]
 
-        tight_constraints = np.array([], dtype=np.bool)
+        tight_constraints = np.array([], dtype=bool)
 
         # Constraint is tight if ||F * x - g|| <= eps (1 + rel_tol)
         if F.size > 0:
@@ -61,14 +284,7 @@ class Strategy(object):
     def __eq__(self, other):
         """Overrides the default equality implementation"""
         if isinstance(other, Strategy):
-
-            if np.any(self.tight_constraints != other.tight_constraints):
-                return False
-
-            if np.any(self.int_vars != other.int_vars):
-                return False
-
-            return True
+            return self._hash == other._hash and self._key == other._key
         else:
             return False
 
@@ -83,50 +299,258 @@ class Strategy(object):
 
         """
 
-        if len(self.tight_constraints) != data['n_ineq']:
-            e.warn("Tight constraints not compatible with problem. " +
+        if self._n_tight != data['n_ineq']:
+            e.warning("Tight constraints not compatible with problem. " +
                    "Different than the number of inequality constraints.")
             return False
 
-        if len(self.int_vars) != len(data['int_vars_idx']):
-            e.warn("Integer variables not compatible " +
+        if len(self._int_vars) != len(data[cps.INT_IDX]):
+            e.warning("Integer variables not compatible " +
                    "with problem. IDs not " +
                    "matching an integer variable.")
             return False
 
         return True
 
-    def apply(self, data, inverse_data):
+    def apply(self, data, inverse_data, reduce_A=True):
         """TODO: Docstring for apply.
 
         Args:
             data (TODO): TODO
             inverse_data (TODO): TODO
+            reduce_A (bool): Build the reduced matrix A_red. Not needed
+                if the KKT matrix is already factorized. Default True.
 
         Returns: TODO
 
         """
-        n_eq, n_var = data[cps.A].shape
-        n_ineq = data[cps.F].shape[0]
+        for k in [cps.P + "_red", cps.Q + "_red", "cont_idx", "int_vars"]:
+            data.pop(k, None)
+
+        if self.eliminates_int_vars(data):
+            # Substitute integer variables and keep continuous ones
+            cont = self.continuous_idx(data)
+            if reduce_A:
+                S_tight, _ = self.row_selectors(data)
+                A_active = S_tight @ data[cps.F]
+                data[cps.A + "_red"] = \
+                    spa.vstack([data[cps.A], A_active],
+                               format='csc')[:, cont]
+                data[cps.P + "_red"] = data[cps.P][cont][:, cont]
+
+            rhs = self.kkt_rhs(data, data[cps.Q], data[cps.B], data[cps.G])
+            data[cps.Q + "_red"] = -rhs[:len(cont)]
+            data[cps.B + "_red"] = rhs[len(cont):]
+            data["cont_idx"] = cont
+            data["int_vars"] = self._int_vars.astype(float)
+
+        else:
+            if reduce_A:
+                S_tight, S_int = self.row_selectors(data)
+
+                # Edit data by increasing the dimension of A
+                # 1. Fix tight constraints: F_active x = g_active
+                A_active = S_tight @ data[cps.F]
+
+                # 2. Fix integer variables: F_fix x = g_fix
+                # Combine in A_ref and b_red
+                data[cps.A + "_red"] = spa.vstack([data[cps.A], A_active,
+                                                   S_int], format='csc')
 
-        # Edit data by increasing the dimension of A
-        # 1. Fix tight constraints: F_active x = g_active
-        A_active = data[cps.F][self.tight_constraints]
-        b_active = data[cps.G][self.tight_constraints]
+            data[cps.B + "_red"] = self.reduce_b(data[cps.B], data[cps.G])
 
-        # 2. Fix integer variables: F_fix x = g_fix
-        A_fix = spa.eye(n_var, format='csc')[data[cps.INT_IDX]]
-        b_fix = self.int_vars
+        self.store_inverse_data(data, inverse_data)
 
-        # Combine in A_ref and b_red
-        data[cps.A + "_red"] = spa.vstack([data[cps.A], A_active, A_fix])
-        data[cps.B + "_red"] = np.concatenate([data[cps.B], b_active, b_fix])
+    def store_inverse_data(self, data, inverse_data):
+        """Store the strategy in the inverse data needed to recover
+        the dual variables of the original problem.
 
-        # Store inverse data
+        Args:
+            data (dict): Problem data.
+            inverse_data (dict): Solver inverse data.
+
+        """
         inverse_data['tight_constraints'] = self.tight_constraints
         inverse_data['int_vars'] = self.int_vars
-        inverse_data['n_eq'] = n_eq
-        inverse_data['n_ineq'] = n_ineq
+        inverse_data['n_eq'] = data[cps.A].shape[0]
+        inverse_data['n_ineq'] = data[cps.F].shape[0]
+
+    def reduce_b(self, b, g):
+        """
+        Reduced constraint vector :code:`b_red` of the equality
+        constrained problem obtained by applying the strategy.
+
+        Args:
+            b (numpy array): Equality constraints vector.
+            g (numpy array): Inequality constraints vector.
+
+        The vectors can also be matrices with one column per point.
+
+        Returns: Vector (or matrix) :code:`[b; g_tight; int_vars]`.
+
+        """
+        b_fix = self._int_vars
+        if np.ndim(b) == 2:
+            b_fix = np.tile(b_fix[:, None], (1, b.shape[1]))
+        return np.concatenate([b, g[self.tight_idx], b_fix])
+
+
+# Number of bits set for each byte value
+_POPCOUNT = np.array([bin(i).count('1') for i in range(256)], dtype=np.uint8)
+
+
+class StrategyTable(object):
+    """
+    Columnar store of strategies.
+
+    Each strategy is a row of a packed bit matrix of tight constraints
+    and a row of an integer matrix of integer variables. Indexing with an
+    integer returns a :class:`Strategy` sharing memory with the table.
+    Indexing with a slice or an array of labels returns a new table.
+
+    Parameters
+    ----------
+    tight_bits : numpy uint8 array
+        Tight constraints packed by row with :code:`np.packbits`.
+    int_vars : numpy int array
+        Value of the integer variables, one row per strategy.
+    n_tight : int
+        Number of inequality constraints.
+    """
+
+    def __init__(self, tight_bits, int_vars, n_tight):
+        self.tight_bits = np.asarray(tight_bits, dtype=np.uint8)
+        self.int_vars = np.asarray(int_vars, dtype=np.int64)
+        self.n_tight = int(n_tight)
+        self._index = None  # Strategy -> label dictionary (lazy)
+        self._strategies = None  # Label -> strategy dictionary (lazy)
+
+    @classmethod
+    def from_strategies(cls, strategies):
+        """Create table from a list of strategies."""
+        missing = [i for i, s in enumerate(strategies) if s is None]
+        if missing:
+            e.value_error("Missing strategies at indices %s. "
+                          "Encode them with StrategyEncoder." % missing)
+        if len(strategies) == 0:
+            return cls(np.empty((0, 0), dtype=np.uint8),
+                       np.empty((0, 0), dtype=np.int64), 0)
+
+        return cls(np.vstack([s._tight_bits for s in strategies]),
+                   np.vstack([s._int_vars for s in strategies]),
+                   strategies[0]._n_tight)
+
+    def __len__(self):
+        return len(self.tight_bits)
+
+    def __getitem__(self, idx):
+        if isinstance(idx, (int, np.integer)):
+            # Keep the strategies to reuse their cached selectors
+            if getattr(self, '_strategies', None) is None:
+                self._strategies = {}
+            idx = int(idx) % len(self) if idx < 0 else int(idx)
+            if idx not in self._strategies:
+                self._strategies[idx] = Strategy.from_packed(
+                    self.tight_bits[idx], self.n_tight, self.int_vars[idx])
+            return self._strategies[idx]
+        return StrategyTable(self.tight_bits[idx], self.int_vars[idx],
+                             self.n_tight)
+
+    def __iter__(self):
+        for i in range(len(self)):
+            yield self[i]
+
+    def __contains__(self, strategy):
+        return strategy in self.index
+
+    def __getstate__(self):
+        """Do not pickle the lookup dictionary and the strategies."""
+        state = self.__dict__.copy()
+        state['_index'] = None
+        state['_strategies'] = None
+        return state
+
+    @property
+    def index(self):
+        """Dictionary mapping each strategy to its label."""
+        if self._index is None:
+            self._index = {s: i for i, s in enumerate(self)}
+        return self._index
+
+    def lookup(self, strategies):
+        """
+        Get the labels of a list of strategies.
+
+        Parameters
+        ----------
+        strategies : Strategy list
+            Strategies to look up.
+
+        Returns
+        -------
+        numpy int array
+            Labels of the strategies. -1 if a strategy is not in the table.
+        """
+        index = self.index
+        return np.fromiter((index.get(s, -1) for s in strategies),
+                           dtype=int, count=len(strategies))
+
+    @property
+    def tight_constraints(self):
+        """Tight constraints as a numpy bool matrix."""
+        return np.unpackbits(self.tight_bits, axis=1,
+                             count=self.n_tight).astype(bool)
+
+    def to_array(self):
+        """Convert strategies to a matrix with one row per strategy."""
+        return np.hstack([self.tight_constraints, self.int_vars])
+
+    def distance_matrix(self, other=None, chunk_size=1000,
+                        int_vars=True, normalize=True):
+        """
+        Compute the normalized manhattan distance between all pairs of
+        strategies as in :func:`strategy_distance`.
+
+        The tight constraints distance is the Hamming distance between
+        the packed bits.
+
+        Parameters
+        ----------
+        other : StrategyTable, optional
+            Strategies to compare with. Defaults to the table itself.
+        chunk_size : int, optional
+            Number of rows compared at once to bound memory.
+        int_vars : bool, optional
+            Include the distance between the integer variables.
+            Defaults to True.
+        normalize : bool, optional
+            Divide by the strategies length. Defaults to True.
+
+        Returns
+        -------
+        numpy array
+            Distance matrix of dimension :code:`len(self) x len(other)`.
+        """
+        other = self if other is None else other
+        n_total = self.n_tight + self.int_vars.shape[1]
+        dist = np.empty((len(self), len(other)))
+
+        for start in range(0, len(self), chunk_size):
+            end = min(start + chunk_size, len(self))
+            xor = np.bitwise_xor(self.tight_bits[start:end, None, :],
+                                 other.tight_bits[None, :, :])
+            d = _POPCOUNT[xor].sum(axis=2, dtype=np.int64)
+            if int_vars:
+                d += np.abs(self.int_vars[start:end, None, :] -
+                            other.int_vars[None, :, :]).sum(axis=2)
+            dist[start:end] = d
+
+        if not normalize:
+            return dist
+
+        if not int_vars:
+            n_total = self.n_tight
+        return dist / max(n_total, 1)
 
 
 def unique_strategies(strategies):
@@ -140,20 +564,12 @@ def unique_strategies(strategies):
 
     Returns
     -------
-    Strategy set :
-        Unique strategies.
+    Strategy list :
+        Unique strategies in order of first appearance.
     """
 
-    # Using set (we must define hash to use this)
-    unique = list(set(strategies))
-
-    # Using list
-    #  unique = []
-    #  # traverse for all elements
-    #  for x in strategies:
-    #      # check if x exists in unique_list or not
-    #      if x not in unique:
-    #          unique.append(x)
+    # Using dict keys (we must define hash to use this)
+    unique = list(dict.fromkeys(strategies))
 
     return unique
 
@@ -161,22 +577,73 @@ def unique_strategies(strategies):
 def assign_to_unique_strategy(strategy, unique_strategies):
     y = next((index for (index, s) in enumerate(unique_strategies)
              if strategy == s), -1)
-    #  y = -1
-    #  n_unique_strategies = len(unique_strategies)
-    #  for j in range(n_unique_strategies):
-    #      if unique_strategies[j] == strategy:
-    #          y = j
-    #          break
     if y == -1:
         e.value_error("Strategy not found")
     return y
 
 
-def encode_strategies(strategies, batch_size=stg.JOBLIB_BATCH_SIZE,
-                      parallel=True):
+class StrategyEncoder(object):
+    """
+    Incremental strategy encoder.
+
+    It keeps the strategy -> label dictionary across calls so that only
+    new strategies are processed. Missing strategies (None), e.g., from
+    failed solves, are labeled -1 and not stored.
+    """
+
+    def __init__(self):
+        self._labels = {}
+        self._unique = []
+        self._encoding = None
+
+    def __len__(self):
+        """Number of unique strategies."""
+        return len(self._unique)
+
+    @property
+    def encoding(self):
+        """Table of unique strategies."""
+        if self._encoding is None or len(self._encoding) != len(self):
+            self._encoding = StrategyTable.from_strategies(self._unique)
+        return self._encoding
+
+    def encode(self, strategies):
+        """
+        Encode new strategies.
+
+        Parameters
+        ----------
+        strategies : Strategies array
+            Array of strategies to be encoded.
+
+        Returns
+        -------
+        numpy array
+            Encodings for each strategy in strategies. -1 for
+            missing strategies.
+        """
+        labels = self._labels
+        unique = self._unique
+        y = np.empty(len(strategies), dtype=int)
+        for i, s in enumerate(strategies):
+            if s is None:
+                y[i] = -1
+                continue
+            label = labels.setdefault(s, len(unique))
+            if label == len(unique):
+                unique.append(s)
+            y[i] = label
+
+        return y
+
+
+def encode_strategies(strategies):
     """
     Encode strategies
 
+    Single pass over the strategies using a dictionary from strategy
+    to label. Unique strategies are labeled in order of first appearance.
+    Missing strategies (None) are labeled -1.
 
     Parameters
     ----------
@@ -187,29 +654,24 @@ def encode_strategies(strategies, batch_size=stg.JOBLIB_BATCH_SIZE,
     -------
     numpy array
         Encodings for each strategy in strategies.
-    Strategies array
-        Array of unique strategies.
+    StrategyTable
+        Table of unique strategies.
     """
     stg.logger.info("Encoding strategies")
-    N = len(strategies)
 
-    stg.logger.info("Getting unique set of strategies")
     start_time = time()
-    unique = unique_strategies(strategies)
+    encoder = StrategyEncoder()
+    y = encoder.encode(strategies)
     end_time = time()
-    stg.logger.info("Extraction time %.3f sec" % (end_time - start_time))
-    n_unique_strategies = len(unique)
-    stg.logger.info("Found %d unique strategies" % n_unique_strategies)
 
-    # Map strategies to number
-    n_jobs = u.get_n_processes() if parallel else 1
-    stg.logger.info("Assign samples to unique strategies (n_jobs = %d)"
-                    % n_jobs)
+    stg.logger.info("Found %d unique strategies" % len(encoder))
+    n_missing = np.sum(y < 0)
+    if n_missing:
+        e.warning("%d points have no strategy" % n_missing)
+    stg.logger.info("Encoding time %.3f sec" % (end_time - start_time))
 
-    results = Parallel(n_jobs=n_jobs, batch_size=batch_size)(delayed(assign_to_unique_strategy)(s, unique) for s in tqdm(strategies))
-    y = np.array(results)
+    return y, encoder.encoding
 
-    return y, unique
 
 def strategy2array(s):
     """Convert strategy to array"""
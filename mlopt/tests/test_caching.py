@@ -3,6 +3,8 @@ import cvxpy as cp
 import numpy as np
 import mlopt
 from mlopt.sampling import uniform_sphere_sample
+from mlopt.kkt import BorderedKKTFactors
+from mlopt.cache import cache_entry_nbytes
 import pandas as pd
 import numpy.testing as npt
 from mlopt.tests.settings import TEST_TOL as TOL
@@ -60,17 +62,181 @@ class TestCaching(unittest.TestCase):
         self.m = m
         self.df_test = df_test
 
+    def assert_same_results(self, results, reference):
+        """Compare solutions and costs at the test points"""
+        for i in range(len(self.df_test)):
+            npt.assert_array_almost_equal(results[i]['x'],
+                                          reference[i]['x'],
+                                          decimal=TOL)
+            npt.assert_array_almost_equal(results[i]['cost'],
+                                          reference[i]['cost'],
+                                          decimal=TOL)
+
+    def solve_cached(self, **cache_options):
+        """Cache factors with cache_options and check that the solutions
+        at the test points do not change"""
+        reference = self.m.solve(self.df_test, use_cache=True)
+        self.m.cache_factors(**cache_options)
+        results = self.m.solve(self.df_test, use_cache=True)
+        self.assert_same_results(results, reference)
+        return results
+
     def test_solve(self):
         """Solve problem with or without caching"""
         caching = self.m.solve(self.df_test, use_cache=True)
         no_caching = self.m.solve(self.df_test, use_cache=False)
+        self.assert_same_results(caching, no_caching)
+
+    def test_policy(self):
+        """Solve problem with affine policies or cached factors"""
+        self.solve_cached(policy=True)
+
+        self.assertTrue(self.m._cache_has_policy())
+        for label in range(self.m.n_strategies):
+            self.assertIn('policy', self.m._solver_cache[label])
+
+    def test_regions(self):
+        """Solve problem locating points in the critical regions"""
+        caching = self.m.solve(self.df_test, use_cache=True)
+        self.m.build_regions()
+        regions = self.m.solve(self.df_test, use_cache=True)
 
+        self.assertEqual(len(self.m._regions), self.m.n_strategies)
+        self.assert_same_results(regions, caching)
+
+    def test_early_exit(self):
+        """Early exit picks the same solution as all candidates"""
+        m = self.m
+        classes = m._learner.predict(mlopt.utils.pandas2array(self.df_test))
         for i in range(len(self.df_test)):
-            npt.assert_array_almost_equal(caching[i]['x'],
-                                          no_caching[i]['x'],
+            m._problem.populate(self.df_test.iloc[i])
+            early = m.choose_best(m._problem._get_problem_data(),
+                                  classes[i], early_exit=True)
+            full = m.choose_best(m._problem._get_problem_data(),
+                                 classes[i], early_exit=False)
+            npt.assert_array_almost_equal(early['x'], full['x'],
                                           decimal=TOL)
-
-            # Compare cost
-            npt.assert_array_almost_equal(caching[i]['cost'],
-                                          no_caching[i]['cost'],
+            npt.assert_array_almost_equal(early['cost'], full['cost'],
                                           decimal=TOL)
+
+    def test_batch(self):
+        """Solve problem in batch or point by point"""
+        caching = self.m.solve(self.df_test, use_cache=True)
+        batch = self.m.solve(self.df_test, batch=True)
+
+        self.assertEqual(len(batch), len(self.df_test))
+        self.assert_same_results(batch, caching)
+
+    def test_batch_maximize(self):
+        """Solve maximization problem in batch or point by point"""
+        m = self.m
+        problem = m._problem.cvxpy_problem
+        m_max = mlopt.Optimizer(
+            cp.Problem(cp.Maximize(-problem.objective.expr),
+                       problem.constraints))
+
+        # Same strategies and learner as the minimization problem
+        m_max._learner = m._learner
+        m_max.encoding = m.encoding
+        m_max.X_train, m_max.y_train = m.X_train, m.y_train
+        m_max.cache_factors(parallel=False)
+
+        caching = m_max.solve(self.df_test, use_cache=True)
+        batch = m_max.solve(self.df_test, batch=True)
+        self.assert_same_results(batch, caching)
+
+        minimize = m.solve(self.df_test, batch=True)
+        npt.assert_array_almost_equal(batch.cost, -minimize.cost,
+                                      decimal=TOL)
+
+    def test_lazy(self):
+        """Solve problem with a lazy memory bounded factor cache"""
+        m = self.m
+        counts = np.bincount(m.y_train, minlength=m.n_strategies)
+        max_bytes = cache_entry_nbytes(m._solver_cache[np.argmax(counts)])
+
+        for eviction in ['lru', 'lfu']:
+            with self.subTest(eviction=eviction):
+                reference = m.solve(self.df_test, use_cache=True)
+                m.cache_factors(lazy=True, max_bytes=max_bytes,
+                                eviction=eviction, prewarm=1)
+                cache = m._solver_cache
+
+                # Most frequent strategy factorized in advance
+                self.assertEqual(len(cache.resident), 1)
+                self.assertEqual(counts[cache.resident[0]], counts.max())
+
+                lazy = m.solve(self.df_test, use_cache=True)
+                self.assert_same_results(lazy, reference)
+
+                # At most one strategy resident. The others are evicted.
+                self.assertLessEqual(len(cache.resident), 1)
+                self.assertGreater(cache.misses, 0)
+                self.assertEqual(cache.evictions,
+                                 1 + cache.misses - len(cache.resident))
+
+    def test_budget(self):
+        """Eager caching keeps the most frequent strategies in budget"""
+        m = self.m
+        if m.n_strategies < 3:
+            self.skipTest("Budget test needs more than two strategies")
+        counts = np.bincount(m.y_train, minlength=m.n_strategies)
+        order = np.argsort(counts, kind='stable')[::-1]
+        nbytes = [cache_entry_nbytes(m._solver_cache[label])
+                  for label in order]
+        reference = m.solve(self.df_test, use_cache=True)
+
+        max_bytes = nbytes[0] + nbytes[1]
+        m.cache_factors(max_bytes=max_bytes, parallel=False)
+        cache = m._solver_cache
+        self.assertEqual(sorted(cache.resident), sorted(order[:2]))
+        self.assertEqual(cache.evictions, 0)
+        self.assertLessEqual(cache.resident_bytes, cache.max_bytes)
+
+        # Same strategies factorized in the worker processes
+        m.cache_factors(lazy=True, max_bytes=max_bytes, parallel=False)
+        self.assertFalse(m._parallel_prewarm(order, 2, 1))
+        m._problem.close_pool()
+        cache = m._solver_cache
+        self.assertEqual(sorted(cache.resident), sorted(order[:2]))
+        self.assertEqual(cache.evictions, 0)
+
+        self.assert_same_results(m.solve(self.df_test, use_cache=True),
+                                 reference)
+
+    def test_parallel_cache(self):
+        """Factors computed in parallel processes match the serial ones"""
+        m = self.m
+        m.cache_factors(parallel=False)
+        rhs, serial = {}, {}
+        for label in range(m.n_strategies):
+            factors = m._solver_cache[label]['factors']
+            rhs[label] = np.random.randn(factors.n)
+            serial[label] = factors(rhs[label])
+
+        m.cache_factors(lazy=True, parallel=False)
+        self.assertEqual(len(m._solver_cache.resident), 0)
+        m._parallel_prewarm(np.arange(m.n_strategies), 2, 1)
+
+        cache = m._solver_cache
+        self.assertEqual(len(cache.resident), m.n_strategies)
+        for label in range(m.n_strategies):
+            npt.assert_array_almost_equal(
+                cache.peek(label)['factors'](rhs[label]), serial[label],
+                decimal=TOL)
+
+        self.solve_cached(parallel=True)
+
+    def test_updates(self):
+        """Solve problem with factors derived from similar strategies"""
+        if self.m.n_strategies < 2:
+            self.skipTest("Updates need more than one strategy")
+        self.solve_cached(parallel=False, updates=True)
+
+        # Bordered updates of the base factors are used
+        cache = self.m._solver_cache
+        derived = np.flatnonzero(cache.bases >= 0)
+        self.assertGreater(len(derived), 0)
+        self.assertTrue(any(isinstance(cache[label]['factors'],
+                                       BorderedKKTFactors)
+                            for label in derived))
@@ -1,7 +1,12 @@
 import unittest
 import cvxpy as cp
 from cvxpy.error import SolverError
-from mlopt.kkt import KKTSolver
+from cvxpy.reductions.solvers.defines import INSTALLED_MI_SOLVERS
+import cvxpy.settings as cps
+from mlopt.kkt import KKTSolver, BorderedKKTFactors, ReducedKKTFactors, \
+    SymbolicKKTFactors, installed_kkt_backends, factorize_kkt_matrix, \
+    select_kkt_backend, solve_kkt_factors
+from mlopt.cache import FactorCache
 from mlopt.tests.settings import TEST_TOL as TOL
 from mlopt.strategy import Strategy
 import mlopt.settings as stg
@@ -68,6 +73,205 @@ class TestKKT(unittest.TestCase):
                                 obj_kkt,
                                 decimal=TOL)
 
+    def test_eliminate_int_vars(self):
+        """Test that eliminating fixed integer variables
+           gives the same solution as fixing them with constraints
+        """
+        # Mark y in z = (x, y) as integer and fix it with a strategy
+        # without solving a MIP
+        n_int = 3
+        z = cp.Variable(self.n + n_int)
+        x, y = z[:self.n], z[self.n:]
+        prob = cp.Problem(cp.Minimize(cp.quad_form(x, self.P) +
+                                      self.q.T @ x + cp.sum_squares(y)),
+                          [self.A @ x + cp.sum(y) == self.b])
+        y_fix = np.array([1, -2, 0])
+        tight_bits = np.packbits(np.zeros(0, dtype=bool))
+
+        solver = KKTSolver()
+        results = []
+        self.addCleanup(setattr, stg, 'ELIMINATE_INT_VARS',
+                        stg.ELIMINATE_INT_VARS)
+        for eliminate in [False, True]:
+            stg.ELIMINATE_INT_VARS = eliminate
+            data, _, inverse_data = \
+                prob.get_problem_data(solver=stg.DEFAULT_SOLVER)
+            col = prob._cache.param_prog.var_id_to_col[z.id]
+            int_idx = np.arange(col + self.n, col + self.n + n_int)
+            data[cps.INT_IDX] = int_idx
+            strategy = Strategy.from_packed(tight_bits, 0, y_fix)
+            self.assertEqual(strategy.eliminates_int_vars(data), eliminate)
+
+            # Reduced KKT system rows and variables
+            n_eq = data[cps.A].shape[0]
+            if eliminate:
+                npt.assert_array_equal(strategy.kkt_rows(data),
+                                       np.arange(n_eq))
+            else:
+                npt.assert_array_equal(strategy.kkt_rows(data),
+                                       np.arange(n_eq + n_int))
+            n_var = data[cps.A].shape[1]
+            cont_idx = np.setdiff1d(np.arange(n_var), int_idx)
+            npt.assert_array_equal(strategy.continuous_idx(data), cont_idx)
+            if eliminate:
+                # Fixed values are inserted in the solution
+                sol = np.ones(len(cont_idx) + n_eq)
+                x_sol, _ = strategy.kkt_solution(data, sol)
+                npt.assert_array_equal(x_sol[int_idx], y_fix)
+                npt.assert_array_equal(x_sol[cont_idx], 1.)
+
+                # Integer variables terms are reused with the same
+                # matrices
+                q_fix, b_fix = strategy.int_vars_terms(data)
+                self.assertIs(strategy.int_vars_terms(data)[0], q_fix)
+                npt.assert_almost_equal(
+                    strategy.kkt_rhs(data, data[cps.Q], data[cps.B],
+                                     data[cps.G])[len(cont_idx):],
+                    data[cps.B] - b_fix, decimal=TOL)
+
+            strategy.apply(data, inverse_data[-1])
+            results.append(solver.solve_via_data(data, warm_start=True,
+                                                 verbose=False,
+                                                 solver_opts={}))
+
+        npt.assert_almost_equal(results[0]['x'], results[1]['x'],
+                                decimal=TOL)
+        npt.assert_almost_equal(results[0]['x'][int_idx], y_fix,
+                                decimal=TOL)
+        npt.assert_almost_equal(results[0]['cost'], results[1]['cost'],
+                                decimal=TOL)
+
+    @unittest.skipUnless(stg.DEFAULT_SOLVER in INSTALLED_MI_SOLVERS,
+                         "Default solver does not support integer variables")
+    def test_eliminate_int_vars_mip(self):
+        """Test that eliminating the integer variables of a MIP
+           solution gives the same solution as fixing them with
+           constraints
+        """
+        x = cp.Variable(self.n)
+        y = cp.Variable(3, integer=True)
+        prob = cp.Problem(cp.Minimize(cp.quad_form(x, self.P) +
+                                      self.q.T @ x + cp.sum_squares(y)),
+                          [self.A @ x + cp.sum(y) == self.b])
+
+        solver = KKTSolver()
+        results = []
+        self.addCleanup(setattr, stg, 'ELIMINATE_INT_VARS',
+                        stg.ELIMINATE_INT_VARS)
+        for eliminate in [False, True]:
+            stg.ELIMINATE_INT_VARS = eliminate
+            data, chain, inverse_data = \
+                prob.get_problem_data(solver=stg.DEFAULT_SOLVER)
+            raw = chain.solver.solve_via_data(data, True, False, {})
+            x_raw = chain.solver.invert(raw, inverse_data[-1])
+            strategy = Strategy(x_raw.primal_vars[chain.solver.VAR_ID],
+                                data)
+            strategy.apply(data, inverse_data[-1])
+            results.append(solver.solve_via_data(data, warm_start=True,
+                                                 verbose=False,
+                                                 solver_opts={}))
+
+        npt.assert_almost_equal(results[0]['x'], results[1]['x'],
+                                decimal=TOL)
+        npt.assert_almost_equal(results[0]['cost'], results[1]['cost'],
+                                decimal=TOL)
+
+    def test_backends(self):
+        """Test that all installed backends solve the KKT system"""
+        KKT = spa.bmat([[self.P + spa.eye(self.n), self.A.T],
+                        [self.A, None]], format='csc')
+        rhs = np.random.randn(self.n + self.m, 3)
+        for backend in installed_kkt_backends():
+            factors = factorize_kkt_matrix(KKT, backend=backend,
+                                           n_var=self.n)
+            npt.assert_almost_equal(KKT @ solve_kkt_factors(factors, rhs),
+                                    rhs, decimal=TOL)
+            npt.assert_almost_equal(KKT @ factors(rhs[:, 0]), rhs[:, 0],
+                                    decimal=TOL)
+            self.assertGreater(factors.nbytes, 0)
+
+    def test_refactorize(self):
+        """Test refactorization of matrices with the same pattern"""
+        KKT = spa.bmat([[self.P + spa.eye(self.n), self.A.T],
+                        [self.A, None]], format='csc')
+        KKT_new = KKT.copy()
+        KKT_new.data = KKT_new.data * (1 + np.random.rand(KKT.nnz))
+        KKT_new = (KKT_new + KKT_new.T) / 2
+        rhs = np.random.randn(self.n + self.m)
+        for backend in installed_kkt_backends():
+            factors = factorize_kkt_matrix(KKT, backend=backend,
+                                           n_var=self.n, refactorize=True)
+            factors_new = factors.refactorize(KKT_new)
+            npt.assert_almost_equal(KKT_new @ factors_new(rhs), rhs,
+                                    decimal=TOL)
+            # Original factors are not modified
+            npt.assert_almost_equal(KKT @ factors(rhs), rhs, decimal=TOL)
+
+    def test_symbolic(self):
+        """Test refactorization with the symbolic analysis only"""
+        KKT = spa.bmat([[self.P + spa.eye(self.n), self.A.T],
+                        [self.A, None]], format='csc')
+        KKT_new = KKT.copy()
+        KKT_new.data = KKT_new.data * (1 + np.random.rand(KKT.nnz))
+        KKT_new = (KKT_new + KKT_new.T) / 2
+        rhs = np.random.randn(self.n + self.m)
+        self.assertEqual(select_kkt_backend(KKT, refactorize=True),
+                         stg.SUPERLU)
+        symbolic = SymbolicKKTFactors(KKT, n_var=self.n)
+        npt.assert_almost_equal(KKT_new @ symbolic.refactorize(KKT_new)(rhs),
+                                rhs, decimal=TOL)
+
+        # Numerical factors are not stored
+        factors = factorize_kkt_matrix(KKT, backend=stg.SUPERLU,
+                                       n_var=self.n)
+        self.assertLess(symbolic.nbytes, factors.nbytes)
+
+    def test_bordered_update(self):
+        """Test factors derived from KKT matrix with different rows"""
+        def kkt_matrix(rows):
+            A = self.A.tocsr()[rows]
+            return spa.bmat([[self.P + spa.eye(self.n), A.T],
+                             [A, None]], format='csc')
+
+        base_rows = np.arange(7)
+        rows = np.array([0, 1, 2, 4, 5, 7, 8])
+        base = factorize_kkt_matrix(kkt_matrix(base_rows), n_var=self.n)
+        KKT = kkt_matrix(rows)
+        factors = BorderedKKTFactors(KKT, self.n, base, base_rows, rows)
+        rhs = np.random.randn(self.n + len(rows), 3)
+        npt.assert_almost_equal(KKT @ solve_kkt_factors(factors, rhs), rhs,
+                                decimal=TOL)
+        npt.assert_almost_equal(KKT @ factors(rhs[:, 0]), rhs[:, 0],
+                                decimal=TOL)
+
+        # The base factors count in the cache memory once
+        cache = FactorCache(2, None)
+        cache.add(1, {'factors': factors})
+        self.assertEqual(cache.resident_bytes, factors.nbytes + base.nbytes)
+        cache.add(0, {'factors': base})
+        self.assertEqual(cache.resident_bytes, factors.nbytes + base.nbytes)
+
+    def test_redundant_rows(self):
+        """Test KKT systems with redundant constraint rows"""
+        A = self.A.tocsr()[:5]
+        A = spa.vstack([A, A[1], 2 * A[3] - A[0]]).tocsc()
+        KKT = spa.bmat([[self.P + spa.eye(self.n), A.T],
+                        [A, None]], format='csc')
+        rhs = np.concatenate([np.random.randn(self.n),
+                              A @ np.random.randn(self.n)])
+        rhs_inconsistent = np.copy(rhs)
+        rhs_inconsistent[-1] += 1.
+        for backend in installed_kkt_backends():
+            factors = factorize_kkt_matrix(KKT, backend=backend,
+                                           n_var=self.n)
+            self.assertTrue(factors.regularized)
+            npt.assert_almost_equal(KKT @ factors(rhs), rhs, decimal=TOL)
+            self.assertTrue(np.all(np.isnan(factors(rhs_inconsistent))))
+
+            reduced = ReducedKKTFactors(KKT, self.n, backend=backend)
+            self.assertFalse(reduced.singular)
+            npt.assert_almost_equal(KKT @ reduced(rhs), rhs, decimal=TOL)
+
     #  def test_not_applicable(self):
     #      """
     #      Test that it complains if problem is not an equality
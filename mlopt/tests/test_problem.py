@@ -2,15 +2,26 @@ import unittest
 import numpy as np
 import numpy.testing as npt
 import cvxpy as cp
-from mlopt.problem import Problem
+from mlopt.problem import Problem, _populate_and_solve
 from mlopt.settings import DEFAULT_SOLVER
 from mlopt.tests.settings import TEST_TOL as TOL
 from copy import deepcopy
+import cvxpy.settings as cps
+import pandas as pd
 
 
 class TestProblem(unittest.TestCase):
     def setUp(self):
-        pass
+        # Portfolio-like problem with parameters only in the vectors
+        np.random.seed(1)
+        self.n = 5
+        self.x = cp.Variable(self.n)
+        self.mu = cp.Parameter(self.n, name='mu')
+        cvxpy_problem = cp.Problem(
+            cp.Minimize(cp.sum_squares(self.x) - self.mu @ self.x),
+            [cp.sum(self.x) == 1, self.x >= 0])
+        self.problem = Problem(cvxpy_problem)
+        self.theta = pd.DataFrame({'mu': list(np.random.randn(10, self.n))})
 
     def test_violation(self):
         """Test problem violation"""
@@ -62,3 +73,120 @@ class TestProblem(unittest.TestCase):
 
         npt.assert_almost_equal(x_problem, x_cvxpy, decimal=TOL)
         npt.assert_almost_equal(cost_problem, cost_cvxpy, decimal=TOL)
+
+    def test_problem_data_batch(self):
+        """Batch problem vectors match the ones computed by CVXPY."""
+        np.random.seed(1)
+        n = 6
+        x = cp.Variable(n)
+        mu = cp.Parameter(n, name='mu')
+        M = cp.Parameter((2, 2), name='M')
+        c = cp.Parameter(name='c')
+        constraints = [cp.sum(x) == c, x >= 0,
+                       cp.reshape(x[:4], (2, 2)) <= M]
+        cvxpy_problem = cp.Problem(cp.Minimize(cp.sum_squares(x) - mu @ x
+                                               + c),
+                                   constraints)
+        problem = Problem(cvxpy_problem)
+        self.assertFalse(problem.parameters_in_matrices)
+
+        n_points = 5
+        theta = pd.DataFrame({'mu': list(np.random.randn(n_points, n)),
+                              'M': [np.random.rand(2, 2)
+                                    for _ in range(n_points)],
+                              'c': 1. + np.random.rand(n_points)})
+        batch = problem.problem_data_batch(theta)
+
+        for i in range(n_points):
+            problem.populate(theta.iloc[i])
+            data, inverse_data, _ = problem._get_problem_data()
+            npt.assert_almost_equal(batch[cps.Q][i], data[cps.Q],
+                                    decimal=TOL)
+            npt.assert_almost_equal(batch[cps.B][i], data[cps.B],
+                                    decimal=TOL)
+            npt.assert_almost_equal(batch[cps.G][i], data[cps.G],
+                                    decimal=TOL)
+            npt.assert_almost_equal(batch[cps.OFFSET][i],
+                                    inverse_data[-1][cps.OFFSET],
+                                    decimal=TOL)
+
+    def test_parameter_map_check(self):
+        """Wrong parameter map falls back to the parametric program."""
+        problem, theta = self.problem, self.theta
+        results = problem.solve_parametric(theta, parallel=False)
+        self.assertTrue(problem.parameter_map_valid)
+
+        # Corrupt the map
+        problem._param_map = -problem.parameter_map
+        problem._param_map_valid = None
+        self.assertFalse(problem.parameter_map_valid)
+        with self.assertRaises(ValueError):
+            problem.problem_data_batch(theta)
+
+        results_check = problem.solve_parametric(theta, parallel=False)
+        for i in range(len(results)):
+            npt.assert_almost_equal(results_check[i]['cost'],
+                                    results[i]['cost'], decimal=TOL)
+
+    def test_result_batch(self):
+        """Result batch matches the list of results."""
+        problem, theta = self.problem, self.theta
+        results = problem.solve_parametric(theta, parallel=False)
+        batch = problem.solve_parametric(theta, parallel=False,
+                                         result_batch=True)
+
+        self.assertEqual(len(batch), len(results))
+        for i in range(len(results)):
+            npt.assert_almost_equal(batch.x[i], results[i]['x'],
+                                    decimal=TOL)
+            npt.assert_almost_equal(batch[i]['cost'], results[i]['cost'],
+                                    decimal=TOL)
+            self.assertEqual(batch[i]['strategy'], results[i]['strategy'])
+
+        # Empty batch
+        batch = problem.solve_parametric(theta.iloc[:0], parallel=False,
+                                         result_batch=True)
+        self.assertEqual(len(batch), 0)
+        self.assertEqual(batch.x.shape, (0, problem.n_var))
+        self.assertEqual(batch.to_list(), [])
+
+    def test_need_strategy(self):
+        """Strategy is computed only when needed."""
+        problem = self.problem
+        self.mu.value = np.random.randn(self.n)
+
+        results = problem.solve()
+        results_fast = problem.solve(strategy=results['strategy'],
+                                     need_strategy=False)
+        self.assertNotIn('strategy', results_fast)
+        npt.assert_almost_equal(results_fast['cost'], results['cost'],
+                                decimal=TOL)
+
+    def test_worker_pool(self):
+        """Parallel solutions reuse the worker pool and match serial ones."""
+        problem, theta = self.problem, self.theta
+
+        # The pool is created once and reused
+        pool = problem.worker_pool(2)
+        self.assertIs(problem._pool, pool)
+        self.assertIs(problem.worker_pool(2), pool)
+        results_parallel = pool.map(
+            _populate_and_solve,
+            [(theta.iloc[i], None, True) for i in range(len(theta))],
+            solver_options=problem.solver_options)
+        self.assertIs(problem.worker_pool(2), pool)
+
+        # Changing the solver invalidates the workers problem
+        problem.solver = problem.solver
+        self.assertIsNone(problem._pool)
+        self.assertFalse(pool._finalizer.alive)
+
+        pool = problem.worker_pool(2)
+        problem.close_pool()
+        self.assertIsNone(problem._pool)
+        self.assertFalse(pool._finalizer.alive)
+
+        results = problem.solve_parametric(theta, parallel=False)
+        for i in range(len(results)):
+            npt.assert_almost_equal(results_parallel[i]['cost'],
+                                    results[i]['cost'], decimal=TOL)
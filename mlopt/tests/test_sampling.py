@@ -3,8 +3,9 @@ import numpy as np
 import numpy.testing as npt
 from mlopt import Optimizer, PYTORCH
 from mlopt.tests.settings import TEST_TOL as TOL
-from mlopt.sampling import uniform_sphere_sample
+from mlopt.sampling import uniform_sphere_sample, Sampler
 import mlopt.settings as s
+from mlopt.utils import DataFrameBuffer, pandas2array
 import tempfile
 import os
 import pandas as pd
@@ -81,6 +82,51 @@ class TestSampling(unittest.TestCase):
                         < self.optimizer._sampler.good_turing_smooth)
 
 
+class TestGoodTuring(unittest.TestCase):
+
+    def test_incremental_frequencies(self):
+        """Incremental frequencies match computing them from scratch"""
+        np.random.seed(1)
+        labels = np.random.geometric(0.1, size=1000)
+
+        sampler = Sampler(None, n_samples=len(labels))
+        sampler.compute_good_turing(labels)
+        good_turing = sampler.good_turing
+
+        sampler_inc = Sampler(None)
+        for i in range(0, len(labels), 150):
+            sampler_inc.n_samples += len(labels[i:i + 150])
+            sampler_inc.update_good_turing(labels[i:i + 150])
+
+        freq = np.bincount(labels)
+        npt.assert_array_equal(sampler_inc.freq, freq)
+        npt.assert_array_equal(sampler_inc.freq_freq[1:],
+                               np.bincount(freq[freq > 0])[1:])
+        self.assertEqual(sampler_inc.good_turing, good_turing)
+        self.assertEqual(good_turing,
+                         np.sum(freq == 1) / len(labels))
+
+
+class TestSampleBuffers(unittest.TestCase):
+
+    def test_dataframe_buffer(self):
+        """Buffer returns the appended dataframes"""
+        np.random.seed(1)
+        buffer = DataFrameBuffer(capacity=7)
+        dfs = [sampling_function(5) for _ in range(4)]
+        for df in dfs:
+            df['c'] = np.random.randn(len(df))
+            buffer.append(df)
+
+        df_all = pd.concat(dfs, ignore_index=True)
+        df_buffer = buffer.to_dataframe()
+
+        self.assertEqual(list(df_buffer.columns), list(df_all.columns))
+        npt.assert_array_equal(pandas2array(df_buffer),
+                               pandas2array(df_all))
+        npt.assert_array_equal(buffer.array, pandas2array(df_all))
+
+
 if __name__ == '__main__':
     unittest.main()
 
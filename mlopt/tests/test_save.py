@@ -133,6 +133,21 @@ class TestSave(unittest.TestCase):
                     # Create new optimizer and load
                     new_optimizer = Optimizer.from_file(file_name)
 
+                    # Cached factors are loaded without recomputing them
+                    self.assertEqual(len(new_optimizer._solver_cache),
+                                     len(self.optimizer._solver_cache))
+
+                    # Missing factors are computed from the saved
+                    # representative parameters
+                    cache = new_optimizer._solver_cache
+                    label = cache.resident[0]
+                    factors = cache[label]['factors']
+                    del cache._entries[label]
+                    del cache._nbytes[label]
+                    rhs = np.random.randn(factors.n)
+                    npt.assert_almost_equal(cache[label]['factors'](rhs),
+                                            factors(rhs), decimal=TOL)
+
                     # Predict with optimizer
                     res = self.optimizer.solve(self.df_test)
 
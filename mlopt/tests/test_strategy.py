@@ -0,0 +1,179 @@
+import unittest
+import pickle as pkl
+import numpy as np
+import numpy.testing as npt
+import scipy.sparse as spa
+import cvxpy.settings as cps
+from mlopt.strategy import Strategy, StrategyTable, StrategyEncoder, \
+    encode_strategies, strategy2array, strategy_distance
+
+
+def random_data(n_var, n_ineq, int_idx):
+    """Create random inequality data to compute strategies."""
+    return {cps.F: spa.random(n_ineq, n_var, density=0.5,
+                              data_rvs=np.random.randn, format='csc'),
+            cps.G: np.random.randn(n_ineq),
+            cps.INT_IDX: np.array(int_idx, dtype=int)}
+
+
+class TestStrategy(unittest.TestCase):
+
+    def setUp(self):
+        np.random.seed(0)
+        self.n_var = 20
+        self.n_ineq = 13  # Not a multiple of 8 to test padding
+        self.data = random_data(self.n_var, self.n_ineq, [0, 3, 5])
+
+    def random_strategy(self):
+        """Strategy from a random point with rounded integer variables."""
+        x = np.random.randn(self.n_var)
+        x[self.data[cps.INT_IDX]] = np.random.randint(0, 2, 3)
+        return x, Strategy(x, self.data)
+
+    def test_packed_roundtrip(self):
+        """Packed strategy matches unpacked tight constraints"""
+        x, s = self.random_strategy()
+        tight = s.get_tight_constraints(x, self.data)
+        npt.assert_array_equal(s.tight_constraints, tight)
+        npt.assert_array_equal(s.int_vars, x[self.data[cps.INT_IDX]])
+
+        s_new = Strategy.from_packed(np.packbits(tight), self.n_ineq,
+                                     x[self.data[cps.INT_IDX]])
+        self.assertEqual(s, s_new)
+        self.assertEqual(hash(s), hash(s_new))
+
+    def test_int_vars_rounding(self):
+        """Integer variables are rounded within tolerance"""
+        x, s = self.random_strategy()
+        int_idx = self.data[cps.INT_IDX]
+        x_near = np.copy(x)
+        x_near[int_idx] += 1e-6
+        self.assertEqual(Strategy(x_near, self.data), s)
+
+        x_far = np.copy(x)
+        x_far[int_idx[0]] += 0.3
+        with self.assertRaises(ValueError):
+            Strategy(x_far, self.data)
+
+        x_large = np.copy(x)
+        x_large[int_idx[0]] = 1e20
+        with self.assertRaises(ValueError):
+            Strategy(x_large, self.data)
+
+    def test_hash_equality(self):
+        """Different strategies have different hashes"""
+        strategies = []
+        for i in range(self.n_ineq):
+            tight = np.zeros(self.n_ineq, dtype=bool)
+            tight[i] = True
+            strategies.append(Strategy.from_packed(np.packbits(tight),
+                                                   self.n_ineq, [0, 0, 1]))
+
+        self.assertEqual(len(set(hash(s) for s in strategies)),
+                         self.n_ineq)
+        self.assertEqual(len(set(strategies)), self.n_ineq)
+
+        # Same tight constraints but different integer variables
+        s1 = Strategy.from_packed(strategies[0]._tight_bits,
+                                  self.n_ineq, [1, 0, 1])
+        self.assertNotEqual(s1, strategies[0])
+
+        # Same packed bits but different number of constraints
+        s2 = Strategy.from_packed(strategies[0]._tight_bits,
+                                  self.n_ineq + 1, [0, 0, 1])
+        self.assertNotEqual(s2, strategies[0])
+
+    def test_pickle(self):
+        """Strategies are equal after pickling"""
+        _, s = self.random_strategy()
+        s_new = pkl.loads(pkl.dumps(s))
+        self.assertEqual(s, s_new)
+        self.assertEqual(hash(s), hash(s_new))
+
+    def test_encode_strategies(self):
+        """Encoding labels strategies in order of first appearance"""
+        unique = [self.random_strategy()[1] for _ in range(5)]
+        idx = np.random.randint(0, 5, 100)
+        strategies = [unique[i] for i in idx]
+
+        y, encoding = encode_strategies(strategies)
+
+        self.assertEqual(len(y), len(strategies))
+        self.assertEqual(len(encoding), len(set(strategies)))
+        for i in range(len(strategies)):
+            self.assertEqual(encoding[y[i]], strategies[i])
+        npt.assert_array_equal(np.unique(y, return_index=True)[1],
+                               np.sort(np.unique(y, return_index=True)[1]))
+
+    def test_encode_missing_strategies(self):
+        """Missing strategies are labeled -1 and not stored"""
+        unique = [self.random_strategy()[1] for _ in range(3)]
+        strategies = [unique[0], None, unique[1], unique[0], None,
+                      unique[2]]
+
+        y, encoding = encode_strategies(strategies)
+
+        npt.assert_array_equal(y, [0, -1, 1, 0, -1, 2])
+        self.assertEqual(len(encoding), 3)
+        for i in np.flatnonzero(y >= 0):
+            self.assertEqual(encoding[y[i]], strategies[i])
+        with self.assertRaises(ValueError):
+            StrategyTable.from_strategies(strategies)
+
+    def test_incremental_encoding(self):
+        """Incremental encoding matches encoding all strategies at once"""
+        unique = [self.random_strategy()[1] for _ in range(10)]
+        strategies = [unique[i] for i in np.random.randint(0, 10, 300)]
+        y, encoding = encode_strategies(strategies)
+
+        encoder = StrategyEncoder()
+        y_inc = np.concatenate([encoder.encode(strategies[i:i + 70])
+                                for i in range(0, 300, 70)])
+
+        npt.assert_array_equal(y, y_inc)
+        npt.assert_array_equal(encoder.encoding.to_array(),
+                               encoding.to_array())
+
+    def test_strategy_table(self):
+        """Strategy table matches the list of strategies"""
+        strategies = [Strategy.from_packed(np.packbits(tight), self.n_ineq,
+                                           [0, 1, 0])
+                      for tight in np.eye(7, self.n_ineq, dtype=bool)]
+        table = StrategyTable.from_strategies(strategies)
+
+        self.assertEqual(len(table), len(strategies))
+        for i, s in enumerate(table):
+            self.assertEqual(s, strategies[i])
+            npt.assert_array_equal(table.to_array()[i], strategy2array(s))
+
+        # Rows share memory with the table
+        self.assertTrue(np.shares_memory(table[2]._tight_bits,
+                                         table.tight_bits))
+        self.assertTrue(np.shares_memory(table[1:4].tight_bits,
+                                         table.tight_bits))
+
+        # Lookup and subsets
+        sub = table[[4, 1]]
+        npt.assert_array_equal(sub.lookup(strategies), [-1, 1, -1, -1, 0,
+                                                        -1, -1])
+        npt.assert_array_equal(table.lookup(list(sub)), [4, 1])
+
+        # Pickle
+        table_new = pkl.loads(pkl.dumps(table))
+        npt.assert_array_equal(table_new.lookup(strategies), np.arange(7))
+
+    def test_distance_matrix(self):
+        """Pairwise distances match strategy_distance"""
+        strategies = [self.random_strategy()[1] for _ in range(6)]
+        table = StrategyTable.from_strategies(strategies)
+        dist = table.distance_matrix(chunk_size=4)
+
+        for i in range(len(strategies)):
+            for j in range(len(strategies)):
+                npt.assert_almost_equal(
+                    dist[i, j], strategy_distance(strategies[i],
+                                                  strategies[j]))
+
+
+if __name__ == '__main__':
+    unittest.main()
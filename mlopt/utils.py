@@ -110,6 +110,108 @@ def pandas2array(X):
     return X_new
 
 
+class GrowingArray(object):
+    """
+    Numpy array growing along the first axis with amortized
+    reallocations. The capacity is doubled when it is exceeded.
+
+    Parameters
+    ----------
+    shape : tuple, optional
+        Shape of each row. Defaults to scalars.
+    dtype : numpy dtype, optional
+        Array data type. Defaults to float.
+    capacity : int, optional
+        Initial number of rows allocated.
+    """
+
+    def __init__(self, shape=(), dtype=float, capacity=1024):
+        self._data = np.empty((capacity,) + tuple(shape), dtype=dtype)
+        self._n = 0
+
+    def __len__(self):
+        return self._n
+
+    def append(self, values):
+        """Append rows to the array."""
+        values = np.asarray(values, dtype=self._data.dtype)
+        n_new = len(values)
+
+        capacity = len(self._data)
+        if self._n + n_new > capacity:
+            capacity = max(2 * capacity, self._n + n_new)
+            data = np.empty((capacity,) + self._data.shape[1:],
+                            dtype=self._data.dtype)
+            data[:self._n] = self._data[:self._n]
+            self._data = data
+
+        self._data[self._n:self._n + n_new] = values
+        self._n += n_new
+
+    @property
+    def array(self):
+        """View of the stored rows."""
+        return self._data[:self._n]
+
+
+class DataFrameBuffer(object):
+    """
+    Growing float buffer for dataframes with scalar or array cells.
+
+    Each row is stored flattened as in :func:`pandas2array`. The column
+    names and cell shapes are taken from the first dataframe appended.
+
+    Parameters
+    ----------
+    capacity : int, optional
+        Initial number of rows allocated.
+    """
+
+    def __init__(self, capacity=1024):
+        self._capacity = capacity
+        self._buffer = None
+        self._columns = None   # (name, cell shape) pairs
+
+    def __len__(self):
+        return 0 if self._buffer is None else len(self._buffer)
+
+    def append(self, df):
+        """Append the rows of a dataframe."""
+        if self._columns is None:
+            self._columns = [(c, np.shape(df[c].iloc[0]))
+                             for c in df.columns]
+            n_cols = sum(int(np.prod(shape)) for _, shape in self._columns)
+            self._buffer = GrowingArray(shape=(n_cols,),
+                                        capacity=self._capacity)
+
+        values = [np.asarray(df[c].values.tolist(), dtype=float).reshape(
+                  len(df), -1) for c, _ in self._columns]
+        self._buffer.append(np.hstack(values))
+
+    @property
+    def array(self):
+        """View of the stored rows as a 2d numpy array."""
+        return self._buffer.array
+
+    def to_dataframe(self):
+        """Dataframe with the stored rows and the original columns."""
+        if self._columns is None:
+            return pd.DataFrame()
+
+        X = self.array
+        data = {}
+        col = 0
+        for name, shape in self._columns:
+            size = int(np.prod(shape))
+            if shape == ():
+                data[name] = X[:, col]
+            else:
+                data[name] = [x.reshape(shape) for x in X[:, col:col + size]]
+            col += size
+
+        return pd.DataFrame(data)
+
+
 def suboptimality(cost_pred, cost_test, sense):
     """Compute suboptimality"""
     if np.abs(cost_test) < stg.DIVISION_TOL: